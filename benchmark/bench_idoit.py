@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the i-doit API class against the local stand-in server ``fake_idoit.py`` - runs offline.
+
+Reports throughput, p50/p95/p99 latency and peak memory (tracemalloc) of single calls, batches,
+paging and bulk helpers. Save a run with ``--save`` and compare later runs with ``--baseline``,
+the exit code is 1 if a scenario got slower than the tolerance allows.
+
+The time of ``import idoit`` in a fresh interpreter is reported too, with ``--import-budget`` the
+exit code is 1 if it takes longer.
+
+    python3 benchmark/bench_idoit.py --latency 0.005 --save bench_baseline.json
+    python3 benchmark/bench_idoit.py --latency 0.005 --baseline bench_baseline.json
+    python3 benchmark/bench_idoit.py --only import --import-budget 30
+"""
+
+from sys import version_info, exit
+MIN_PYTHON = (3, 6)
+if version_info < MIN_PYTHON:
+    exit("Python %s.%s or later is required.\n" % MIN_PYTHON)
+
+import argparse
+import json
+import logging
+import math
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from idoit import IdoitAPI
+from idoitTransport import RequestsTransport, Urllib3Transport
+from fake_idoit import FakeIdoit, FakeIdoitServer
+
+log = logging.getLogger(__name__)
+
+
+def percentile(values, p):
+    """p-th percentile of values (nearest rank)"""
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = max(0, min(len(values) - 1, int(math.ceil(p / 100.0 * len(values))) - 1))
+    return values[k]
+
+
+def import_time(module='idoit', runs=5):
+    """Fastest cumulative import time of module in a new interpreter (ms), measured with ``-X importtime``"""
+    best = None
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+                              cwd=ROOT, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        for line in proc.stderr.splitlines():
+            fields = line.split('|')
+            if len(fields) == 3 and fields[2].strip() == module and not fields[2].startswith('  '):
+                ms = int(fields[1]) / 1000.0
+                best = ms if best is None else min(best, ms)
+    return best
+
+
+def scenarios(api, objects):
+    """Dict name => (function doing one operation, number of i-doit objects handled per operation)"""
+    first = FakeIdoit.FIRST_ID
+    ids = list(range(first, first + objects))
+    hundred = ids[:100]
+    records = [("host{:05d}".format(i - first), "10.20.{}.{}".format((i - first) // 256, (i - first) % 256), None)
+                for i in hundred]
+    desired = {i: {'C__CATG__GLOBAL': {'cmdb_status': 6}} for i in hundred}
+
+    return {
+        'single.get_object': (lambda: api.get_object(first), 1),
+        'single.get_general': (lambda: api.get_general(first), 1),
+        'single.find_host_ip_serial': (lambda: api.find_host_ip_serial('host00001', '10.20.0.1'), 1),
+        'batch.category_read_100': (lambda: api.get_categories_from_objects(hundred, 'C__CATG__IP'), 100),
+        'paging.get_all_objects': (lambda: api.get_all_objects({'status': 2}, page_size=250), objects),
+        'bulk.get_ipv4_addresses_100': (lambda: api.get_ipv4_addresses(hundred), 100),
+        'bulk.find_host_ip_serial_100': (lambda: api.find_host_ip_serial_bulk(records), 100),
+        'bulk.reconcile_100': (lambda: api.reconcile_categories(desired), 100),
+    }
+
+
+def run(api, name, func, repeat, memory):
+    """Run func repeat times, returns dict with statistics"""
+    def call():
+        # with --error-rate some operations fail, count them and go on
+        try:
+            func()
+            return 0
+        except Exception as e:
+            log.debug("{}: {}".format(name, e))
+            return 1
+
+    call()                                          # warm up
+    lat = []
+    errors = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        t = time.perf_counter()
+        errors += call()
+        lat.append(time.perf_counter() - t)
+    total = time.perf_counter() - start
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        'ops': repeat,
+        'errors': errors,
+        'ops_per_s': repeat / total if total else 0.0,
+        'p50_ms': percentile(lat, 50) * 1000,
+        'p95_ms': percentile(lat, 95) * 1000,
+        'p99_ms': percentile(lat, 99) * 1000,
+        'peak_kib': peak / 1024.0 if peak is not None else None,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Names of scenarios whose p50 latency is more than tolerance (fraction) above baseline"""
+    slower = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if b and r['p50_ms'] > b['p50_ms'] * (1 + tolerance):
+            slower.append(name)
+    return slower
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark IdoitAPI against a local fake i-doit")
+    parser.add_argument('--objects', type=int, default=2000, help="objects of fake i-doit")
+    parser.add_argument('--latency', type=float, default=0.0, help="server latency per HTTP request (seconds)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="random additional latency (seconds)")
+    parser.add_argument('--payload-size', type=int, default=0, help="bytes of padding per category entry")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="probability of a JSON-RPC error")
+    parser.add_argument('--transport', choices=('requests', 'urllib3'), default='requests',
+                        help="transport of IdoitAPI")
+    parser.add_argument('--gzip', action='store_true', help="fake i-doit compresses responses")
+    parser.add_argument('--compress-threshold', type=int, default=None, help="compress request bodies of this size")
+    parser.add_argument('--repeat', type=int, default=20, help="operations per scenario")
+    parser.add_argument('--only', default=None, help="run only scenarios containing this text")
+    parser.add_argument('--no-memory', action='store_true', help="skip tracemalloc run")
+    parser.add_argument('--save', default=None, help="write results as JSON to this file")
+    parser.add_argument('--baseline', default=None, help="compare with results of --save")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slow down against baseline")
+    parser.add_argument('--import-budget', type=float, default=None, help="max. ms of 'import idoit'")
+    args = parser.parse_args()
+
+    # errors of --error-rate are logged by IdoitAPI with level ERROR
+    logging.basicConfig(level=logging.CRITICAL, format='%(message)s')
+
+    failed = False
+    import_ms = import_time()
+    print("import idoit: {:.1f} ms".format(import_ms))
+    if args.import_budget is not None and import_ms > args.import_budget:
+        print("Import takes longer than budget of {:.1f} ms".format(args.import_budget))
+        failed = True
+
+    fake = FakeIdoit(args.objects, args.latency, args.jitter, args.payload_size, args.error_rate)
+    server = FakeIdoitServer(fake, gzip_responses=args.gzip).start()
+    transport = Urllib3Transport() if args.transport == 'urllib3' else RequestsTransport()
+    api = IdoitAPI(server.base_url, False, 'en', 'bench', 'bench', 'bench', transport=transport)
+    api.compress_threshold = args.compress_threshold
+
+    results = {}
+    print("{:32s} {:>10s} {:>10s} {:>10s} {:>10s} {:>10s} {:>7s}".format(
+            'scenario', 'ops/s', 'p50 ms', 'p95 ms', 'p99 ms', 'peak KiB', 'errors'))
+    for name, (func, n_obj) in scenarios(api, args.objects).items():
+        if args.only and args.only not in name:
+            continue
+        r = run(api, name, func, args.repeat, not args.no_memory)
+        r['objects_per_op'] = n_obj
+        results[name] = r
+        print("{:32s} {:10.1f} {:10.2f} {:10.2f} {:10.2f} {:>10s} {:7d}".format(
+                name, r['ops_per_s'], r['p50_ms'], r['p95_ms'], r['p99_ms'],
+                "{:.0f}".format(r['peak_kib']) if r['peak_kib'] is not None else '-', r['errors']))
+    print("fake i-doit: {} HTTP requests, {} JSON-RPC requests".format(fake.http_requests, fake.requests))
+    server.stop()
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        if slower:
+            print("Slower than baseline (+{:.0%}): {}".format(args.tolerance, ', '.join(slower)))
+            failed = True
+
+    if failed:
+        exit(1)
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the i-doit JSON-RPC endpoint ``/src/jsonrpc.php`` - for benchmarks and offline runs.
+
+Implements login/logout, search, objects.read, object.read/create, category.read/save/purge and batch
+requests on generated data. Latency, payload size and error rate are configurable. Compressed request
+bodies (Content-Encoding gzip or deflate) are accepted, responses are compressed on request.
+"""
+
+from sys import version_info
+MIN_PYTHON = (3, 6)
+if version_info < MIN_PYTHON:
+    exit("Python %s.%s or later is required.\n" % MIN_PYTHON)
+
+import argparse
+import gzip
+import json
+import logging
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+class FakeIdoit():
+    """In-memory i-doit with generated objects that answers JSON-RPC requests
+
+    Args:
+        objects: ``int``: Number of generated objects, IDs start at 1000
+        latency: ``float``: Delay of every HTTP request (seconds)
+        jitter: ``float``: Random additional delay up to this (seconds)
+        payload_size: ``int``: Length of the description of every category entry (bytes)
+        error_rate: ``float``: Probability that a request returns a JSON-RPC error
+        seed: ``int``: Seed for errors and jitter
+    """
+
+    FIRST_ID = 1000
+
+    def __init__(self, objects=1000, latency=0.0, jitter=0.0, payload_size=0, error_rate=0.0, seed=1):
+        self.objects = objects
+        self.latency = latency
+        self.jitter = jitter
+        self.payload_size = payload_size
+        self.error_rate = error_rate
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._store = {}                # (obj_id, category) => list of entries changed by save / purge
+        self._next_id = self.FIRST_ID + objects
+        self.requests = 0               # number of JSON-RPC requests answered
+        self.http_requests = 0          # number of HTTP requests answered
+
+    # ----- generated data -----
+
+    def _obj(self, obj_id):
+        n = obj_id - self.FIRST_ID
+        return {
+            'id': str(obj_id),
+            'title': "host{:05d}".format(n),
+            'sysid': "SYSID_{}".format(obj_id),
+            'type': str(5 if n % 2 else 6),
+            'type_title': 'Server' if n % 2 else 'Switch',
+            'status': '2',
+            'cmdb_status': '6',
+            'created': '2021-01-01 00:00:00',
+            'updated': '2021-01-02 00:00:00',
+        }
+
+    def _exists(self, obj_id):
+        return self.FIRST_ID <= obj_id < self._next_id
+
+    def _ip(self, obj_id):
+        n = obj_id - self.FIRST_ID
+        return "10.{}.{}.{}".format(20 + n // 65536, (n // 256) % 256, n % 256)
+
+    def _generate(self, obj_id, category):
+        n = obj_id - self.FIRST_ID
+        pad = 'x' * self.payload_size
+        o = self._obj(obj_id)
+        if category == 'C__CATG__GLOBAL':
+            return [{'id': str(obj_id), 'objID': str(obj_id), 'title': o['title'], 'sysid': o['sysid'],
+                        'cmdb_status': {'id': '6', 'title': 'in operation', 'const': 'C__CMDB_STATUS__IN_OPERATION'},
+                        'purpose': {'id': '1', 'title': 'Production'}, 'category': None,
+                        'tag': [{'id': '1', 'title': 'bench'}], 'description': pad}]
+        if category == 'C__CATG__IP':
+            ip = self._ip(obj_id)
+            return [{'id': str(obj_id * 10), 'objID': str(obj_id), 'hostname': o['title'], 'domain': 'example.com',
+                        'primary': {'title': 'Yes', 'value': '1'},
+                        'hostaddress': {'ref_id': str(obj_id * 10), 'ref_title': ip, 'ref_type': 'C__OBJTYPE__LAYER3_NET'},
+                        'primary_hostaddress': {'ref_id': str(obj_id * 10), 'ref_title': ip},
+                        'primary_fqdn': [{'title': "{}.example.com".format(o['title'])}], 'description': pad}]
+        if category == 'C__CATG__MODEL':
+            return [{'id': str(obj_id), 'objID': str(obj_id), 'serial': "SN{:08d}".format(n),
+                        'manufacturer': {'id': '3', 'title': 'HP'}, 'description': pad}]
+        if category == 'C__CATG__LOCATION':
+            return [{'id': str(obj_id), 'objID': str(obj_id), 'parent': {'id': '1', 'title': 'Root location'},
+                        'pos': None, 'description': pad}]
+        if category == 'C__CATG__FORMFACTOR':
+            return [{'id': str(obj_id), 'objID': str(obj_id), 'rackunits': '1',
+                        'formfactor': {'id': '1', 'title': '19"', 'const': 'C__FORMFACTOR_TYPE__19INCH'}}]
+        if category == 'C__CATG__CONNECTOR':
+            return [{'id': str(obj_id * 100 + i), 'objID': str(obj_id), 'title': "Port {:02d}".format(i),
+                        'assigned_connector': None, 'connector_sibling': None, 'description': pad}
+                    for i in range(1, 25)]
+        return []
+
+    def _entries(self, obj_id, category):
+        key = (obj_id, category)
+        if key not in self._store:
+            self._store[key] = self._generate(obj_id, category)
+        return self._store[key]
+
+    # ----- JSON-RPC methods -----
+
+    def _objects_read(self, p):
+        f = p.get('filter', {})
+        ids = range(self.FIRST_ID, self._next_id)
+        if 'ids' in f:
+            ids = [int(i) for i in f['ids'] if self._exists(int(i))]
+        objs = [self._obj(i) for i in ids]
+        if f.get('title'):
+            objs = [o for o in objs if o['title'] == f['title']]
+        if f.get('limit'):
+            parts = [int(x) for x in str(f['limit']).split(',')]
+            offset, count = (parts[0], parts[1]) if len(parts) == 2 else (0, parts[0])
+            objs = objs[offset:offset + count]
+        if p.get('categories'):
+            for o in objs:
+                o['categories'] = {c: self._entries(int(o['id']), c) for c in p['categories']}
+        return objs
+
+    def _search(self, p):
+        q = str(p.get('q', '')).lower()
+        ret = []
+        if q.startswith('host') and q[4:].isdigit():
+            obj_id = self.FIRST_ID + int(q[4:])
+            if self._exists(obj_id):
+                ret.append({'documentId': str(obj_id), 'key': 'Global > Title', 'value': q, 'type': 'cmdb', 'score': 100})
+        elif q.startswith('10.'):
+            a, b, c, d = [int(x) for x in q.split('.')]
+            obj_id = self.FIRST_ID + (b - 20) * 65536 + c * 256 + d
+            if self._exists(obj_id):
+                ret.append({'documentId': str(obj_id), 'key': 'Host address > IPv4', 'value': q, 'type': 'cmdb', 'score': 100})
+        return ret
+
+    def _category_save(self, p):
+        entries = self._entries(int(p['object']), p['category'])
+        if 'entry' in p:
+            for e in entries:
+                if int(e['id']) == int(p['entry']):
+                    e.update(p['data'])
+                    return {'success': True, 'message': 'Category entry successfully saved', 'entry': int(e['id'])}
+            raise KeyError("Entry {} not found".format(p['entry']))
+        with self._lock:
+            entry_id = self._next_id * 1000 + len(self._store)
+        e = {'id': str(entry_id), 'objID': str(p['object'])}
+        e.update(p['data'])
+        if len(entries) and p['category'] in ('C__CATG__GLOBAL', 'C__CATG__LOCATION', 'C__CATG__FORMFACTOR',
+                                                'C__CATG__MODEL'):
+            entries[0].update(p['data'])
+            entry_id = entries[0]['id']
+        else:
+            entries.append(e)
+        return {'success': True, 'message': 'Category entry successfully saved', 'entry': int(entry_id)}
+
+    def _category_purge(self, p):
+        key = (int(p['object']), p['category'])
+        self._store[key] = [e for e in self._entries(*key) if int(e['id']) != int(p['entry'])]
+        return {'success': True, 'message': 'Entry {} has been successfully purged'.format(p['entry'])}
+
+    def _object_create(self, p):
+        with self._lock:
+            obj_id = self._next_id
+            self._next_id += 1
+        ret = {'id': obj_id, 'message': 'Object was successfully created', 'success': True}
+        if p.get('categories'):
+            ret['categories'] = {}
+            for c, entries in p['categories'].items():
+                ids = []
+                for e in entries:
+                    ids.append(self._category_save({'object': obj_id, 'category': c, 'data': e})['entry'])
+                ret['categories'][c] = ids
+        return ret
+
+    def call(self, method, params):
+        """Answer one JSON-RPC request
+
+            Returns:
+                'result' of the request or raise exception.
+        """
+        if method == 'idoit.login':
+            return {'result': True, 'userid': '9', 'name': 'admin', 'username': 'admin',
+                    'session-id': 'fake-session', 'client-id': '1', 'client-name': 'Fake'}
+        if method == 'idoit.logout':
+            return {'message': 'Logout successfull', 'result': True}
+        if method == 'idoit.version':
+            return {'login': {'userid': '9'}, 'version': '1.16', 'type': 'FAKE'}
+        if method == 'idoit.search':
+            return self._search(params)
+        if method == 'cmdb.objects.read':
+            return self._objects_read(params)
+        if method == 'cmdb.object.read':
+            return self._obj(int(params['id']))
+        if method == 'cmdb.object.create':
+            return self._object_create(params)
+        if method == 'cmdb.category.read':
+            return self._entries(int(params['objID']), params['category'])
+        if method == 'cmdb.category.save':
+            return self._category_save(params)
+        if method == 'cmdb.category.purge':
+            return self._category_purge(params)
+        if method.startswith(('cmdb.object.', 'cmdb.category.')):
+            return {'success': True, 'message': "{} done".format(method)}
+        raise NotImplementedError("Method {} not found".format(method))
+
+    def handle(self, request):
+        """Answer a JSON-RPC request or batch request (list)"""
+        if isinstance(request, list):
+            return [self.handle(r) for r in request]
+        self.requests += 1
+        ret = {'id': request.get('id'), 'jsonrpc': '2.0'}
+        try:
+            if request.get('method') != 'idoit.login' and self.error_rate and self._random.random() < self.error_rate:
+                raise RuntimeError("Random error of fake i-doit")
+            ret['result'] = self.call(request.get('method'), request.get('params') or {})
+        except Exception as e:
+            ret['error'] = {'code': -32099, 'message': str(e), 'data': None}
+        return ret
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.jitter * self._random.random())
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, without this keep-alive connections wait for delayed ACKs
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        fake = self.server.fake
+        fake.http_requests += 1
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        fake.delay()
+        try:
+            encoding = self.headers.get('Content-Encoding')
+            if encoding == 'gzip':
+                body = gzip.decompress(body)
+            elif encoding == 'deflate':
+                body = zlib.decompress(body)
+            res = fake.handle(json.loads(body.decode('utf-8')))
+        except (ValueError, OSError, zlib.error):
+            res = {'id': None, 'jsonrpc': '2.0', 'error': {'code': -32700, 'message': 'Parse error', 'data': None}}
+        out = json.dumps(res).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if self.server.gzip_responses and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            out = gzip.compress(out)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeIdoitServer(ThreadingMixIn, HTTPServer):
+    """Threaded HTTP server for ``FakeIdoit``, run it with ``start()`` in a background thread
+
+    Example:
+        ``server = FakeIdoitServer(FakeIdoit(objects=5000, latency=0.02))``
+        ``server.start()``
+        ``api = IdoitAPI(server.base_url, False, 'en', 'user', 'pass', 'apikey')``
+
+    Args:
+        fake: ``FakeIdoit``: Data and behaviour of the server
+        host: ``str``: Address to listen on
+        port: ``int``: Port to listen on, 0 = random free port
+        gzip_responses: ``bool``: Compress responses if the client accepts gzip
+    """
+    daemon_threads = True
+
+    def __init__(self, fake, host='127.0.0.1', port=0, gzip_responses=False):
+        HTTPServer.__init__(self, (host, port), _Handler)
+        self.fake = fake
+        self.gzip_responses = gzip_responses
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """URL to pass as base_url to IdoitAPI"""
+        return "http://{}:{}".format(*self.server_address[:2])
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the i-doit JSON-RPC API")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--objects', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds per HTTP request")
+    parser.add_argument('--jitter', type=float, default=0.0, help="random additional seconds per HTTP request")
+    parser.add_argument('--payload-size', type=int, default=0, help="bytes of padding per category entry")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="probability of a JSON-RPC error")
+    parser.add_argument('--gzip', action='store_true', help="compress responses if the client accepts gzip")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    server = FakeIdoitServer(FakeIdoit(args.objects, args.latency, args.jitter, args.payload_size, args.error_rate),
+                                port=args.port, gzip_responses=args.gzip)
+    logging.info("Fake i-doit listening on {}/src/jsonrpc.php".format(server.base_url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -1,9 +1,19 @@
 __version__ = "1.0"
-from pprint import pformat
 import os
 import logging
 import json
-import requests
+import time
+import threading
+from idoitTransport import RequestsTransport
+
+# pprint, requests, concurrent.futures, compression and idoitMetrics are imported on first use,
+# short-lived scripts only pay for what they call
+
+
+def pformat(obj):
+    """``pprint.pformat()``, imported on first use"""
+    from pprint import pformat as _pformat
+    return _pformat(obj)
 
 """Sphinx uses Google Style Python Docstrings"""
 
@@ -27,10 +37,10 @@ class IdoitAPI():
         - cmdb.object.update - ``Implemented``
         - cmdb.object.delete - ``Implemented``
         - cmdb.object.recycle - ``Implemented``
-        - cmdb.object.archive - ``Not implemented``
-        - cmdb.object.purge - ``Not implemented``
-        - cmdb.object.markAsTemplate - ``Not implemented``
-        - cmdb.object.markAsMassChangeTemplate - ``Not implemented``
+        - cmdb.object.archive - ``Implemented``
+        - cmdb.object.purge - ``Implemented``
+        - cmdb.object.markAsTemplate - ``Implemented``
+        - cmdb.object.markAsMassChangeTemplate - ``Implemented``
         - cmdb.objects.read - ``Implemented``
         - cmdb.category.save - ``Implemented``
         - cmdb.category.create - ``Not Implemented``
@@ -48,12 +58,17 @@ class IdoitAPI():
         - cmdb.reports.read - ``Implemented``
 
     Args:
-        base_url: ``str``: Domain Name
+        base_url: ``str``: Domain Name - or URL with scheme, e.g. 'http://127.0.0.1:8080' for a local test server
         verify: ``bool``: Verify SSL Connection?
         language: ``str``: The Language your are using e.g. en or de
         username: ``str``: your Username - can be left empty and set by environment variable IDOIT_USERNAME
         password: ``str``: your Password - can be left empty and set by environment variable IDOIT_PASSWORD
         apikey: ``str``: API Key for this i-doit instance - can be left empty and set by environment variable IDOIT_APIKEY
+        transport: ``Transport``: Object sending the HTTP requests, default ``RequestsTransport`` - see idoitTransport.py,
+            e.g. ``Urllib3Transport`` for less overhead per call or ``RecordingTransport`` / ``ReplayTransport``
+            to record a session and replay it without server
+        lazy: ``bool``: Do not login now but with the first request, construction does no network I/O.
+            Wrong credentials raise with the first request then.
 
     Raise:
         requests.HTTPError: Raised by requests lib.
@@ -62,9 +77,50 @@ class IdoitAPI():
 
     Attributes:
         log_json_request: ``bool``: Set to `True` to log JSON requests send to i-doit.
+        batch_chunk_size: ``int``: Default number of requests per batch request of ``send_batch_chunked()``.
+        batch_max_workers: ``int``: Default number of batch requests ``send_batch_chunked()`` sends concurrently.
+        compress_threshold: ``int``: Compress request bodies of at least this many bytes, default None = never.
+            The web server of i-doit has to decompress them, e.g. Apache with ``SetInputFilter DEFLATE``.
+        compress_encoding: ``str``: 'gzip' or 'deflate', used when compress_threshold is set.
+        transport: ``Transport``: Object sending the HTTP requests, see idoitTransport.py.
+        metrics: ``ClientMetrics``: Client metrics if ``enable_metrics()`` was called, else None.
+        profiler: ``PhaseProfiler``: Profiler if ``enable_profiler()`` was called, else None.
+        debug_ring: ``DebugRing``: Buffer of the last requests if ``enable_debug_ring()`` was called, else None.
+        mirror: ``CMDBMirror``: Set a local mirror (see idoitMirror.py) to read categories from it.
+        MUTATING_METHODS: ``tuple``: JSON-RPC methods that are queued inside ``auto_batch()``.
+        HOOK_EVENTS: ``tuple``: Events of ``add_hook()``.
+        RECONCILE_MATCH_FIELDS: ``dict``: Multi value categories and the field ``reconcile_categories()``
+            identifies an entry by.
+        RECONCILE_READ_ALIASES: ``dict``: Fields that are read with another name than they are written.
     """
 
-    def __init__(self, base_url, verify, language, username=None, password=None, apikey=None):
+    RECONCILE_MATCH_FIELDS = {
+        'C__CATG__IP': 'ipv4_address',
+        'C__CATG__CONTRACT_ASSIGNMENT': 'connected_contract',
+        'C__CATG__IT_SERVICE': 'connected_object',
+    }
+    RECONCILE_READ_ALIASES = {
+        'C__CATG__IP': {'ipv4_address': 'hostaddress'},
+    }
+
+    # cmdb.object.create is not queued, callers need the ID of the new object
+    MUTATING_METHODS = (
+        'cmdb.object.update',
+        'cmdb.object.delete',
+        'cmdb.object.recycle',
+        'cmdb.object.archive',
+        'cmdb.object.purge',
+        'cmdb.object.markAsTemplate',
+        'cmdb.object.markAsMassChangeTemplate',
+        'cmdb.category.save',
+        'cmdb.category.purge',
+        'cmdb.category.quickpurge',
+    )
+
+    HOOK_EVENTS = ('before_send', 'after_response', 'on_error')
+
+    def __init__(self, base_url, verify, language, username=None, password=None, apikey=None, transport=None,
+                 lazy=False):
         self.log = logging.getLogger(__name__)
 
         if username is None:
@@ -91,19 +147,50 @@ class IdoitAPI():
 
         # ID/Cookie of active session
         self.sessionid = ""
-        self.url = 'https://{}/src/jsonrpc.php'.format(self.base_url)
+        if self.base_url.startswith(('http://', 'https://')):
+            self.url = '{}/src/jsonrpc.php'.format(self.base_url.rstrip('/'))
+        else:
+            self.url = 'https://{}/src/jsonrpc.php'.format(self.base_url)
 
         self.batch_list = []
         self.batch_dict = {}        # like batch list, key == json rpc request id
 
         self.log_json_request = False
 
-        self._api_login()
-        # Default JSON-RPC HTTP header for all calls except login()
-        self.session_header = {
-            'Content-Type': 'application/json',
-            'X-RPC-Auth-Session': self.sessionid
-        }
+        # defaults for send_batch_chunked()
+        self.batch_chunk_size = 100
+        self.batch_max_workers = 4
+
+        # request body compression of _post(), off by default
+        self.compress_threshold = None
+        self.compress_encoding = 'gzip'
+
+        # local CMDBMirror (idoitMirror.py) used by get_category_from_object()
+        self.mirror = None
+
+        # active AutoBatch of auto_batch() context manager
+        self._auto_batch = None
+
+        if transport is None:
+            transport = RequestsTransport()
+        self.transport = transport
+
+        # ClientMetrics (idoitMetrics.py), set by enable_metrics()
+        self.metrics = None
+        # PhaseProfiler (idoitMetrics.py), set by enable_profiler()
+        self.profiler = None
+        # DebugRing (idoitMetrics.py), set by enable_debug_ring()
+        self.debug_ring = None
+
+        # callbacks of add_hook(), _hooked is True if there is at least one
+        self._hooks = {event: [] for event in self.HOOK_EVENTS}
+        self._hooked = False
+
+        # Default JSON-RPC HTTP header for all calls except login(), set by _api_login()
+        self.session_header = None
+        self._login_lock = threading.Lock()
+        if not lazy:
+            self._api_login()
 
     def get_version(self):
         """Get version of this class"""
@@ -119,12 +206,275 @@ class IdoitAPI():
         }
         res = self.send_rpc('idoit.login', {}, headers)
         self.sessionid = res['result']['session-id']        
+        self.session_header = {
+            'Content-Type': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+            'X-RPC-Auth-Session': self.sessionid
+        }
+
+    def _get_session_header(self):
+        """Session header, login first if the session was not started yet (``lazy``)"""
+        if self.session_header is None:
+            with self._login_lock:
+                if self.session_header is None:
+                    self._api_login()
+        return self.session_header
 
     def api_logout(self):
         """Terminate active session to i-doit \n
             - Uses: ``idoit.logout``"""
         self.send_rpc('idoit.logout', {})
 
+    def _post(self, data, headers):
+        """Serialize JSON-RPC request or batch request, send it with the transport and decode the response
+
+            Returns:
+                Tuple (response object of the transport, decoded JSON response or None if there is none)
+        """
+        if self.metrics is None and not self._hooked and self.profiler is None and self.debug_ring is None:
+            body = json.dumps(data).encode('utf-8')
+            if self.compress_threshold is not None and len(body) >= self.compress_threshold:
+                body, headers = self._compress(body, headers)
+            response = self.transport.post(self.url, body, headers, self.verify)
+            return (response, self._decode(response))
+        return self._post_traced(data, headers)
+
+    def _post_traced(self, data, headers):
+        """``_post()`` with metrics, hooks, profiler and debug ring"""
+        begin = time.perf_counter()
+        body = json.dumps(data).encode('utf-8')
+        # uncompressed body for the debug ring, the compressed size is used for metrics and hooks
+        raw_body = body
+        if self.compress_threshold is not None and len(raw_body) >= self.compress_threshold:
+            body, headers = self._compress(raw_body, headers)
+        serialized = time.perf_counter()
+        ctx = None
+        if self._hooked:
+            is_batch = isinstance(data, list)
+            entries = data if is_batch else [data]
+            ctx = {
+                'method': 'batch' if is_batch else data.get('method'),
+                'batch': is_batch,
+                'methods': [d.get('method') for d in entries],
+                'ids': [d.get('id') for d in entries],
+                'request_bytes': len(body),
+                'start': time.time(),
+            }
+            self._run_hooks('before_send', ctx)
+
+        start = time.perf_counter()
+        try:
+            response = self.transport.post(self.url, body, headers, self.verify)
+            received = time.perf_counter()
+            res = self._decode(response)
+        except Exception as e:
+            duration = time.perf_counter() - start
+            if self.metrics is not None:
+                self.metrics.record_failure(data, duration, len(body))
+            if ctx is not None:
+                ctx.update(duration=duration, outcome='exception', exception=e, errors=[])
+                self._run_hooks('on_error', ctx)
+            if self.debug_ring is not None:
+                self.debug_ring.capture('batch' if isinstance(data, list) else data.get('method'),
+                                        raw_body, None, b'', duration, True, repr(e))
+                self._dump_debug_ring(repr(e))
+            raise
+        end = time.perf_counter()
+        duration = end - start
+
+        if self.profiler is not None:
+            self.profiler.record('batch' if isinstance(data, list) else data.get('method'),
+                                 {'serialize': serialized - begin, 'network': received - start, 'decode': end - received})
+        if self.metrics is not None:
+            saved = self._response_saved_bytes(response)
+            self.metrics.record(data, res, duration, len(body), len(response.content) - saved, response.status_code,
+                                len(raw_body) - len(body), saved)
+        if self.debug_ring is not None:
+            self.debug_ring.capture('batch' if isinstance(data, list) else data.get('method'), raw_body,
+                                    response.status_code, response.content, duration,
+                                    response.status_code >= 400 or (isinstance(res, dict) and 'error' in res))
+        if ctx is not None:
+            if isinstance(res, list):
+                errors = [r['error'] for r in res if isinstance(r, dict) and 'error' in r]
+            elif isinstance(res, dict) and 'error' in res:
+                errors = [res['error']]
+            else:
+                errors = []
+            ok = response.status_code < 400 and not errors
+            ctx.update(duration=duration, status_code=response.status_code, response_bytes=len(response.content),
+                       errors=errors, outcome='ok' if ok else 'error')
+            self._run_hooks('after_response' if ok else 'on_error', ctx)
+        return (response, res)
+
+    def _debug(self, data, fmt, obj):
+        """Log obj formatted by ``pformat`` with level DEBUG, timed as phase 'log' of request data by the profiler"""
+        if not self.log.isEnabledFor(logging.DEBUG):
+            return
+        if self.profiler is None:
+            self.log.debug(fmt.format(pformat(obj)))
+            return
+        start = time.perf_counter()
+        self.log.debug(fmt.format(pformat(obj)))
+        self.profiler.record('batch' if isinstance(data, list) else data.get('method'),
+                             {'log': time.perf_counter() - start}, calls=0)
+
+    def enable_debug_ring(self, size=100, sample_rate=1.0, max_bytes=4096, path='idoit-debug-{time}-{pid}.json',
+                          max_dumps=10):
+        """Keep the last request/response pairs in memory and write them to a file when ``send_rpc()`` or
+            ``send_rpc_d()`` raise an exception - a cheap alternative to ``log_json_request`` and DEBUG logging,
+            see ``DebugRing`` in idoitMetrics.py for the arguments.
+
+            Returns:
+                ``DebugRing``
+        """
+        from idoitMetrics import DebugRing
+        self.debug_ring = DebugRing(size, sample_rate, max_bytes, path, max_dumps, self.apikey)
+        return self.debug_ring
+
+    def _dump_debug_ring(self, reason):
+        """Write the debug ring to a file if it is enabled"""
+        if self.debug_ring is None:
+            return
+        try:
+            path = self.debug_ring.dump(reason)
+        except (OSError, ValueError) as e:
+            self.log.error("Failed to dump debug ring: {}".format(e))
+            return
+        if path:
+            self.log.error("Last {} requests written to {}".format(len(self.debug_ring), path))
+
+    def enable_profiler(self, helpers=None, memory=False):
+        """Start timing the phases serialize, network, decode and log of every call and the time high-level
+            helpers spend in Python code ('extract'), see ``PhaseProfiler`` in idoitMetrics.py
+
+            Example:
+                ``prof = api.enable_profiler()``
+                ``api.get_general(obj_id)``
+                ``print(prof.report())``
+
+            Args:
+                helpers: ``list``: Names of the methods to profile as helpers, default all methods starting
+                    with ``PhaseProfiler.HELPER_PREFIXES`` like get_*, find_* and extract_*
+                memory: ``bool``: Record allocation peaks of helper calls with tracemalloc
+            Returns:
+                ``PhaseProfiler``
+        """
+        self.disable_profiler()
+        from idoitMetrics import PhaseProfiler
+        self.profiler = PhaseProfiler(memory)
+        self.profiler.attach(self, helpers)
+        return self.profiler
+
+    def disable_profiler(self):
+        """Stop the profiler of ``enable_profiler()`` and restore the helpers
+
+            Returns:
+                ``PhaseProfiler`` with the recorded values or None
+        """
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.detach()
+            self.profiler = None
+        return profiler
+
+    def add_hook(self, event, func):
+        """Call func around every HTTP request - single request or batch (chunk) - e.g. to emit tracing spans.
+
+            Every request calls 'before_send' and then either 'after_response' if it succeeded or 'on_error'
+            if the transport raised an exception, the HTTP status is an error or a JSON-RPC request failed.
+            All hooks of one request get the same context dict, so 'before_send' can store e.g. a span in it.
+
+            Context keys:
+                - method: ``str``: JSON-RPC method or 'batch'
+                - batch: ``bool``: Request is a batch request
+                - methods: ``list``: JSON-RPC methods of the requests
+                - ids: ``list``: JSON-RPC IDs of the requests
+                - request_bytes: ``int``: Size of the request body (params)
+                - start: ``float``: Time the request was sent (``time.time()``)
+                - duration: ``float``: Seconds until the response was decoded
+                - status_code: ``int``: HTTP status code, missing on exceptions
+                - response_bytes: ``int``: Size of the response body, missing on exceptions
+                - errors: ``list``: JSON-RPC error dicts of the response
+                - outcome: ``str``: 'ok', 'error' or 'exception'
+                - exception: ``Exception``: Raised by transport or response decoding
+
+            Exceptions of hooks are logged and ignored. Without hooks requests are not slowed down.
+
+            Args:
+                event: ``str``: 'before_send', 'after_response' or 'on_error'
+                func: ``callable``: Function with the context dict as argument
+            Raise:
+                ValueError: Unknown event.
+        """
+        if event not in self._hooks:
+            raise ValueError("Unknown hook event '{}', use one of {}".format(event, ', '.join(self.HOOK_EVENTS)))
+        self._hooks[event].append(func)
+        self._hooked = True
+
+    def remove_hook(self, event, func):
+        """Remove a function added with ``add_hook()``
+
+            Raise:
+                ValueError: func is not a hook of event.
+        """
+        if event not in self._hooks or func not in self._hooks[event]:
+            raise ValueError("Function is not a hook of event '{}'".format(event))
+        self._hooks[event].remove(func)
+        self._hooked = any(self._hooks.values())
+
+    def _run_hooks(self, event, ctx):
+        for func in self._hooks[event]:
+            try:
+                func(ctx)
+            except Exception:
+                self.log.exception("Hook {} of event {} failed".format(func, event))
+
+    def _compress(self, body, headers):
+        """Compressed body and headers with Content-Encoding of ``compress_encoding``"""
+        if self.compress_encoding == 'deflate':
+            import zlib
+            body = zlib.compress(body)
+        else:
+            import gzip
+            body = gzip.compress(body)
+        headers = dict(headers)
+        headers['Content-Encoding'] = self.compress_encoding
+        return (body, headers)
+
+    def _response_saved_bytes(self, response):
+        """Bytes saved by a compressed response - decoded size minus Content-Length, 0 if not compressed.
+            The transport decompresses the response while it is read."""
+        resp_headers = getattr(response, 'headers', None)
+        if not resp_headers or resp_headers.get('Content-Encoding') not in ('gzip', 'deflate'):
+            return 0
+        try:
+            return max(0, len(response.content) - int(resp_headers.get('Content-Length')))
+        except (TypeError, ValueError):
+            return 0
+
+    def _decode(self, response):
+        """Decoded JSON of response, None on HTTP status 204 or undecodable error responses"""
+        if response.status_code == 204:
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            if response.status_code == 200:
+                raise
+            return None
+
+    def enable_metrics(self):
+        """Start recording per JSON-RPC method call counts, error counts, latency histograms,
+            request/response bytes and batch sizes, see idoitMetrics.py
+
+            Returns:
+                ``ClientMetrics`` - read it with ``snapshot()`` or ``to_prometheus()``
+        """
+        if self.metrics is None:
+            from idoitMetrics import ClientMetrics
+            self.metrics = ClientMetrics()
+        return self.metrics
+
     def send_rpc_d(self, data, batch=False):
         """Generic method to send json-rpc call to server
 
@@ -138,45 +488,39 @@ class IdoitAPI():
         if self.log_json_request:
             self.log.info("send_rpc_d:\n{}".format(json.dumps(data, indent=4, sort_keys=False)))
 
-        response = requests.post(self.url, json=data, headers=self.session_header, verify=self.verify)
-        self.log.debug("response:\n{}".format(pformat(response.json())))
+        response, res = self._post(data, self._get_session_header())
+        self._debug(data, "response:\n{}", res)
 
         if response.status_code == 200:
-            if 'error' not in response.json():
+            if 'error' not in res:
                 if not batch:
-                    return response.json()
+                    return res
                 else: 
                     res_dict = {}
-                    for i in response.json():
+                    for i in res:
                         x = i.pop('id')
                         res_dict[x] = i
                     return res_dict
 
             # tested with wrong user, pass, apikey
-            e = response.json()['error']
+            e = res['error']
             self.log.error("\nError Code: {}\nError Message: {}\nError Data: {}\n".format(e['code'], e['message'], e['data']))
+            self._dump_debug_ring(e['message'])
             raise ValueError(e['message'])
 
+        if response.status_code >= 400:
+            self._dump_debug_ring("HTTP status {}".format(response.status_code))
         return response.raise_for_status()
 
-    def send_rpc(self, method, params_dict, header=None, batch_request=False):
-        """Generic method to send json-rpc call to server.
-            Only set method and method specific params. Parameters like **apikey** and **language** etc will be added.
+    def build_rpc(self, method, params_dict):
+        """Build JSON-RPC request, parameters like **apikey** and **language** will be added.
 
             Args:
-                method: ``dict``: JSON-RPC method to use
+                method: ``str``: JSON-RPC method to use
                 params_dict: ``dict``: Method specific parameters.
-                header: ``dict``: Header if other than default needs to be used.
-
             Returns:
-                JSON object of response or raise exception.
+                JSON-RPC request dictionary with ID 1.
         """
-        #self.log.warning("send_rpc() - method={} - batch_request={}".format(method, batch_request))           #DEBUG
-        if header:
-            headers = header
-        else:
-            headers = self.session_header
-
         data = {
             'id': 1,
             'version': '2.0',
@@ -187,7 +531,23 @@ class IdoitAPI():
             },
         }
         data['params'].update(params_dict)      # add custom params
-        self.log.debug(pformat(data))
+        return data
+
+    def send_rpc(self, method, params_dict, header=None, batch_request=False):
+        """Generic method to send json-rpc call to server.
+            Only set method and method specific params. Parameters like **apikey** and **language** etc will be added.
+
+            Args:
+                method: ``dict``: JSON-RPC method to use
+                params_dict: ``dict``: Method specific parameters.
+                header: ``dict``: Header if other than default needs to be used.
+
+            Returns:
+                JSON object of response or raise exception.
+        """
+        #self.log.warning("send_rpc() - method={} - batch_request={}".format(method, batch_request))           #DEBUG
+        data = self.build_rpc(method, params_dict)
+        self._debug(data, "{}", data)
 
         # update batch list/dict myself instead of build_batch()
         if batch_request:
@@ -197,23 +557,30 @@ class IdoitAPI():
             self.batch_list.append(data)
             return data
 
+        # write-behind queue of auto_batch()
+        if self._auto_batch is not None and method in self.MUTATING_METHODS:
+            return self._auto_batch.add(data)
+
         if self.log_json_request:
             self.log.info("send_rpc:\n{}".format(pformat(data)))
 
-        response = requests.post(self.url, json=data, headers=headers, verify=self.verify)
-        self.log.debug("response code: {}".format(pformat(response.status_code)))
+        response, res = self._post(data, header or self._get_session_header())
+        self.log.debug("response code: {}".format(response.status_code))
         if response.status_code != 204:
-            self.log.debug("response:\n{}".format(pformat(response.json())))
+            self._debug(data, "response:\n{}", res)
 
         if response.status_code == 200:
-            if 'error' not in response.json():
-                return response.json()
+            if 'error' not in res:
+                return res
 
             # tested with wrong user, pass, apikey
-            e = response.json()['error']
+            e = res['error']
             self.log.error("\nError Code: {}\nError Message: {}\nError Data: {}\n".format(e['code'], e['message'], e['data']))
+            self._dump_debug_ring(e['message'])
             raise ValueError(e['message'])
 
+        if response.status_code >= 400:
+            self._dump_debug_ring("HTTP status {}".format(response.status_code))
         return response.raise_for_status()
 
     def send_batch(self):
@@ -230,6 +597,88 @@ class IdoitAPI():
         self.batch_dict = {}
         return (res,lst,dct)
 
+    def send_batch_chunked(self, data_list, chunk_size=None, max_workers=None):
+        """Send a list of JSON-RPC requests as batch requests with up to chunk_size requests each.
+            The JSON-RPC request IDs are renumbered, chunks are send concurrently and may be
+            processed by i-doit in any order.
+
+            Args:
+                data_list: ``list``: JSON-RPC requests, e.g. build by ``build_rpc()``
+                chunk_size: ``int``: Requests per batch request, default ``batch_chunk_size``
+                max_workers: ``int``: Batch requests send concurrently, default ``batch_max_workers``
+            Returns:
+                List of responses in the order of data_list. A response is a dict with key 'result'
+                or 'error', or None when i-doit returned no response for a request.
+        """
+        if chunk_size is None:
+            chunk_size = self.batch_chunk_size
+        if max_workers is None:
+            max_workers = self.batch_max_workers
+
+        for n, data in enumerate(data_list, 1):
+            data['id'] = n
+        chunks = [data_list[i:i+chunk_size] for i in range(0, len(data_list), chunk_size)]
+
+        res = {}
+        if max_workers > 1 and len(chunks) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for r in executor.map(lambda c: self.send_rpc_d(c, True), chunks):
+                    res.update(r)
+            if self.profiler is not None:
+                self.profiler.record_wait({'network': time.perf_counter() - start})
+        else:
+            for c in chunks:
+                res.update(self.send_rpc_d(c, True))
+        return [res.get(n) for n in range(1, len(data_list)+1)]
+
+    def auto_batch(self, max_size=500, max_delay=2.0):
+        """Context manager that queues every mutating call and sends them as batch requests.
+
+            Calls to methods listed in ``MUTATING_METHODS`` (e.g. ``update_object_category()``,
+            ``set_general()``, ``purge_object()``) made inside the ``with`` block are not send
+            immediately but collected and flushed as one batch request when ``max_size`` requests
+            are queued, when the oldest queued request is older than ``max_delay`` seconds or when
+            the block is left. Read requests and ``cmdb.object.create`` (callers need the new object ID)
+            are still send immediately. If the block raises an exception, the queued requests are dropped
+            and not send - see ``AutoBatch.dropped``.
+
+            Example:
+                ``with api.auto_batch(max_size=500, max_delay=2.0) as ab:``
+                    ``for obj_id in obj_ids:``
+                        ``api.update_cmdb_status(obj_id, 6)``
+                ``log.info(ab.errors)``
+
+            Args:
+                max_size: ``int``: Flush when this many requests are queued.
+                max_delay: ``float``: Flush when the oldest queued request is older than this (seconds),
+                    checked whenever a request is queued. ``None`` disables the time threshold.
+            Returns:
+                ``AutoBatch`` object, see ``AutoBatch.results`` and ``AutoBatch.errors``.
+        """
+        return AutoBatch(self, max_size=max_size, max_delay=max_delay)
+
+    def coalesce_writes(self, max_size=500, max_delay=None, categories=None):
+        """Context manager like ``auto_batch()`` that also merges repeated category saves.
+
+            ``cmdb.category.save`` requests for the same object, category and entry ID are merged into
+            one request, the last write per field wins. Saves without entry ID are only merged for
+            single value categories (``AutoBatch.COALESCE_CATEGORIES``), e.g. ``set_general()`` followed
+            by ``update_cmdb_status()`` sends one save on ``C__CATG__GLOBAL``. Other mutating calls for
+            the same object (or category of the object) end merging, so the order of those requests is kept.
+
+            Args:
+                max_size: ``int``: Flush when this many (merged) requests are queued.
+                max_delay: ``float``: Flush when the oldest queued request is older than this (seconds),
+                    default ``None`` = flush only by size and when the block is left.
+                categories: ``list``: Single value categories that may be merged without entry ID.
+            Returns:
+                ``AutoBatch`` object, ``AutoBatch.merged`` counts the merged requests.
+        """
+        return AutoBatch(self, max_size=max_size, max_delay=max_delay, coalesce=True,
+                            coalesce_categories=categories)
+
     #######################
     ## Low Level Methods ##
     #######################
@@ -350,23 +799,72 @@ class IdoitAPI():
             f['filter'].update({'title': title})
         return self.send_rpc('cmdb.objects.read', f, batch_request=batch_request)
 
-    def get_category_from_object(self, obj_id, category, batch_request=False):      # better name?
+    def get_category_from_object(self, obj_id, category, batch_request=False, use_mirror=True):      # better name?
     #def get_category_by_obj_id(self, obj_id, category):         # old name 
         """Read a certain category of an object\n
             - Uses: ``cmdb.category.read``
 
+            Reads from ``mirror`` if it's set and holds the category of this object.
+
             Args:
                 obj_id: ``int``: Object ID of i-doit object.
                 category: ``str``: **Category constant**.
+                use_mirror: ``bool``: Set to False to read from i-doit, e.g. the current value before a write.
             Returns:
                 JSON object of response or raise exception.
         """
+        if self.mirror is not None and use_mirror and not batch_request:
+            entries = self.mirror.read_category(obj_id, category)
+            if entries is not None:
+                return {'jsonrpc': '2.0', 'result': entries}
         p = {
                 'category': category,
                 'objID': int(obj_id)
             }
         return self.send_rpc('cmdb.category.read', p, batch_request=batch_request)
 
+    def get_categories_from_objects(self, obj_ids, categories):
+        """Read categories of many objects with chunked batch requests\n
+            - Uses: ``cmdb.category.read``
+
+            Args:
+                obj_ids: ``list``: Object IDs of i-doit objects.
+                categories: ``str / list``: **Category constant(s)**.
+            Returns:
+                Dict {obj_id: {category: list of entries}}, the list is None if the read failed.
+        """
+        if not isinstance(categories, (list, tuple)):
+            categories = [categories]
+        pairs = [(int(o), c) for o in obj_ids for c in categories]
+        res = self.send_batch_chunked([self.build_rpc('cmdb.category.read', {'category': c, 'objID': o})
+                                        for o, c in pairs])
+        ret = {}
+        for (o, c), r in zip(pairs, res):
+            ret.setdefault(o, {})[c] = r.get('result') if r else None
+        return ret
+
+    def get_all_objects(self, filter_dict, categories=None, page_size=1000):
+        """Fetch all objects filtered by values in filter_dict, read page by page\n
+            - Uses: ``cmdb.objects.read``
+
+            Args:
+                filter_dict: ``dict``: Dictionary with keys to filter request, without 'limit'
+                categories: ``str``: List of **Category constant(s)**.
+                page_size: ``int``: Number of objects per request
+            Returns:
+                List of objects, the 'result' of all requests.
+        """
+        ret = []
+        offset = 0
+        while True:
+            f = dict(filter_dict)
+            f['limit'] = "{}, {}".format(offset, page_size)
+            res = self.get_filtered_objects(f, categories)['result']
+            ret.extend(res)
+            if len(res) < page_size:
+                return ret
+            offset += page_size
+
     def get_filtered_objects(self, filter_dict, categories=None, batch_request=False):
         """Fetch a list of objects filtered by values in filter_dict and/or categories list\n
             - Uses: ``cmdb.objects.read``
@@ -586,6 +1084,127 @@ class IdoitAPI():
         }
         return self.send_rpc('cmdb.category.quickpurge', p, batch_request=batch_request)
 
+    def archive_object(self, obj_id, batch_request=False):
+        """Archive an object\n
+            - Uses: ``cmdb.object.archive``
+
+            Args:
+                obj_id: ``int``: Object ID of i-doit object
+            Returns:
+                JSON object of response or raise exception.
+        """
+        return self.send_rpc('cmdb.object.archive', {'object': int(obj_id)}, batch_request=batch_request)
+
+    def mark_as_template(self, obj_id, batch_request=False):
+        """Mark an object as template\n
+            - Uses: ``cmdb.object.markAsTemplate``
+
+            Args:
+                obj_id: ``int``: Object ID of i-doit object
+            Returns:
+                JSON object of response or raise exception.
+        """
+        return self.send_rpc('cmdb.object.markAsTemplate', {'object': int(obj_id)}, batch_request=batch_request)
+
+    def mark_as_mass_change_template(self, obj_id, batch_request=False):
+        """Mark an object as mass change template\n
+            - Uses: ``cmdb.object.markAsMassChangeTemplate``
+
+            Args:
+                obj_id: ``int``: Object ID of i-doit object
+            Returns:
+                JSON object of response or raise exception.
+        """
+        return self.send_rpc('cmdb.object.markAsMassChangeTemplate', {'object': int(obj_id)}, batch_request=batch_request)
+
+    def _send_per_object(self, method, obj_ids, params=None, id_key='object', chunk_size=None, max_workers=None):
+        """Send method for every object ID with chunked batch requests, the object ID is passed as
+            parameter id_key and params are added
+
+            Returns:
+                Dict {obj_id: json rpc response}, failed requests have key 'error' or are None.
+        """
+        obj_ids = list(dict.fromkeys(int(o) for o in obj_ids))
+        data = []
+        for o in obj_ids:
+            p = {id_key: o}
+            p.update(params or {})
+            data.append(self.build_rpc(method, p))
+        ret = dict(zip(obj_ids, self.send_batch_chunked(data, chunk_size=chunk_size, max_workers=max_workers)))
+        failed = [o for o, r in ret.items() if r is None or 'error' in r]
+        if failed:
+            self.log.error("{}: failed for {} of {} objects: {}".format(method, len(failed), len(ret), failed))
+        return ret
+
+    def archive_objects(self, obj_ids, chunk_size=None, max_workers=None):
+        """Archive many objects with chunked batch requests\n
+            - Uses: ``cmdb.object.archive``
+
+            Args:
+                obj_ids: ``iterable``: Object IDs of i-doit objects
+                chunk_size: ``int``: Requests per batch request, default ``batch_chunk_size``
+                max_workers: ``int``: Batch requests send concurrently, default ``batch_max_workers``
+            Returns:
+                Dict {obj_id: json rpc response}
+        """
+        return self._send_per_object('cmdb.object.archive', obj_ids, chunk_size=chunk_size, max_workers=max_workers)
+
+    def delete_objects(self, obj_ids, move_to='C__RECORD_STATUS__ARCHIVED', chunk_size=None, max_workers=None):
+        """**Delete** many objects with chunked batch requests, see delete_object()\n
+            - Uses: ``cmdb.object.delete``
+
+            Args:
+                obj_ids: ``iterable``: Object IDs of i-doit objects
+                move_to: ``str``: **Status constant** to move to
+                chunk_size: ``int``: Requests per batch request, default ``batch_chunk_size``
+                max_workers: ``int``: Batch requests send concurrently, default ``batch_max_workers``
+            Returns:
+                Dict {obj_id: json rpc response}
+        """
+        return self._send_per_object('cmdb.object.delete', obj_ids, params={'status': move_to}, id_key='id',
+                                        chunk_size=chunk_size, max_workers=max_workers)
+
+    def recycle_objects(self, obj_ids, chunk_size=None, max_workers=None):
+        """Move many objects from archived or deleted back to normal with chunked batch requests\n
+            - Uses: ``cmdb.object.recycle``
+
+            Args:
+                obj_ids: ``iterable``: Object IDs of i-doit objects
+                chunk_size: ``int``: Requests per batch request, default ``batch_chunk_size``
+                max_workers: ``int``: Batch requests send concurrently, default ``batch_max_workers``
+            Returns:
+                Dict {obj_id: json rpc response}
+        """
+        return self._send_per_object('cmdb.object.recycle', obj_ids, chunk_size=chunk_size, max_workers=max_workers)
+
+    def purge_objects(self, obj_ids, chunk_size=None, max_workers=None):
+        """**Purge** many objects from CMDB with chunked batch requests - can't be undone!\n
+            - Uses: ``cmdb.object.purge``
+
+            Args:
+                obj_ids: ``iterable``: Object IDs of i-doit objects
+                chunk_size: ``int``: Requests per batch request, default ``batch_chunk_size``
+                max_workers: ``int``: Batch requests send concurrently, default ``batch_max_workers``
+            Returns:
+                Dict {obj_id: json rpc response}
+        """
+        return self._send_per_object('cmdb.object.purge', obj_ids, chunk_size=chunk_size, max_workers=max_workers)
+
+    def purge_category_entries(self, entries, chunk_size=None, max_workers=None):
+        """Purge many category entries with chunked batch requests, see purge_object()\n
+            - Uses: ``cmdb.category.purge``
+
+            Args:
+                entries: ``iterable``: Tuples (obj_id, category, entry)
+                chunk_size: ``int``: Requests per batch request, default ``batch_chunk_size``
+                max_workers: ``int``: Batch requests send concurrently, default ``batch_max_workers``
+            Returns:
+                Dict {(obj_id, category, entry): json rpc response}
+        """
+        entries = list(dict.fromkeys((int(o), c, int(e)) for o, c, e in entries))
+        data = [self.build_rpc('cmdb.category.purge', {'object': o, 'category': c, 'entry': e}) for o, c, e in entries]
+        return dict(zip(entries, self.send_batch_chunked(data, chunk_size=chunk_size, max_workers=max_workers)))
+
     def get_report(self, rep_id):
         """Get the results of a predefined report
 
@@ -610,28 +1229,55 @@ class IdoitAPI():
             Returns:
                 Dictionary with keys: 'ip' and maybe 'hostname'
         """
-        for i in self.get_category_from_object(obj_id, 'C__CATG__IP')['result']:            
-            self.log.info("get_ipv4_address - type(i):\n{}\ni:\n{}".format(type(i), pformat(i)))
+        return self.extract_ipv4_address(self.get_category_from_object(obj_id, 'C__CATG__IP'), primary, fqdn)
+
+    def extract_ipv4_address(self, jsonrpc_response, primary=True, fqdn=False):
+        """Extract IPv4 Address from response of json-rpc call to 'C__CATG__IP'
+            => to be used with get_ipv4_address()
+
+            Args:
+                jsonrpc_response: ``str``: json-rpc response object
+                primary: ``bool``: When primery=False first match for 'hostaddress' will be returned.
+                fqdn: ``bool``: Add key 'hostname'. **hostname might be 'None'!**
+            Returns:
+                Dictionary with keys: 'ip' and maybe 'hostname' or None
+        """
+        for i in jsonrpc_response['result']:
+            if self.log.isEnabledFor(logging.DEBUG):
+                self.log.debug("extract_ipv4_address - i:\n{}".format(pformat(i)))
             if 'primary_hostaddress' in i and i['primary_hostaddress'] != None:
-                pAddr = {'ip': i['primary_hostaddress']['ref_title']}
-                if fqdn:
-                    if i.get('primary_fqdn'):
-                        pAddr.update({'name': i['primary_fqdn'][0]['title']})
-                    else:
-                        pAddr.update({'name': None})
-                    return {'ip': pAddr['ip'], 'hostname': pAddr['name']}
-                return {'ip': pAddr['ip']}
-            if 'hostaddress' in i and not primary:
+                addr = {'ip': i['primary_hostaddress']['ref_title']}
+            elif 'hostaddress' in i and not primary:
                 addr = {'ip': i['hostaddress']['ref_title']}
-                if fqdn:
-                    if 'primary_fqdn' in i:               # fqdn seems to be always 'primary_fqdn'
-                        addr.update({'name': i['primary_fqdn']['title']})
-                    else:
-                        addr.update({'name': None})
-                    return {'ip': pAddr['ip'], 'hostname': pAddr['name']}
-                return {'ip': pAddr['ip']}
+            else:
+                continue
+            if fqdn:
+                name = i.get('primary_fqdn')          # fqdn seems to be always 'primary_fqdn'
+                if isinstance(name, list):
+                    name = name[0] if name else None
+                addr.update({'hostname': name['title'] if name else None})
+            return addr
         return None
 
+    def get_ipv4_addresses(self, obj_ids, primary=True, fqdn=True):
+        """Fetch IPv4 Address of many objects with chunked batch requests, see get_ipv4_address()\n
+            - Uses: ``cmdb.category.read``
+
+            Args:
+                obj_ids: ``list``: Object IDs of i-doit objects
+                primary: ``bool``: When primery=False first match for 'hostaddress' will be returned.
+                fqdn: ``bool``: Add key 'hostname'. **hostname might be 'None'!**
+            Returns:
+                Dictionary {obj_id: {'ip': ip, 'hostname': fqdn}}, value is None if object has no address.
+        """
+        ret = {}
+        for obj_id, cats in self.get_categories_from_objects(obj_ids, 'C__CATG__IP').items():
+            if cats['C__CATG__IP'] is None:
+                ret[obj_id] = None
+            else:
+                ret[obj_id] = self.extract_ipv4_address({'result': cats['C__CATG__IP']}, primary, fqdn)
+        return ret
+
     def set_ipv4_address(self, obj_id, dev_ip, is_primary=False, hostname=None, fqdn=None, batch_request=False):
         """ Set IPv4 addess and / or hostname, fqdn
 
@@ -654,55 +1300,106 @@ class IdoitAPI():
         res = self.update_object_category(obj_id, 'C__CATG__IP', values, batch_request=batch_request)        
         return res
 
-    def remove_all_ip_addresses(self, obj_id): 
+    def remove_all_ip_addresses(self, obj_id, verify=False):
         """remove all ip entrys from object
             Args:
                 obj_id: ``int``: Object ID of i-doit object to remove IPs from
+                verify: ``bool``: Read category again to verify the entries are gone.
             Returns:
-                List of dicts with keys: 'entry_id', 'ip', 'hostname', 'domain', 'is_primary'
+                List of dicts with keys: 'entry_id', 'ip', 'hostname', 'domain', 'is_primary', 'purged'
+            Raise:
+                ValueError: Purge of an entry failed.
         """
-        res = self.get_category_from_object(obj_id, 'C__CATG__IP')              # DEBUG
-        self.log.info("Switch ip: \n{}".format(pformat(res)))                   # DEBUG
-        ip_entrys = []
-        for i in res['result']:
-            self.log.info("entry id: {}".format(i['id']))
-            ip_entrys.append({
-                'entry_id': i['id'],
-                'ip': i['hostaddress']['ref_title'],
-                'hostname': i['hostname'],
-                'domain': i['domain'],
-                'is_primary': i['primary']['value']
-            })
-
-        for ie in ip_entrys:
-            self.log.info("purge_object ie: {}".format(pformat(ie['entry_id'])))         # DEBUG
-            res = self.purge_object(obj_id, 'C__CATG__IP', ie['entry_id'])
-            self.log.info("purge_object res: \n{}\n".format(pformat(res)))
-
-        res = self.get_category_from_object(obj_id, 'C__CATG__IP')              # DEBUG
-        self.log.info("Switch ip: \n{}".format(pformat(res)))                   # DEBUG
+        ip_entrys = self.remove_ip_addresses({obj_id: None}, verify=verify)[int(obj_id)]
+        self._raise_on_failed_purge(obj_id, ip_entrys)
         return ip_entrys
 
-    def remove_ip_entry(self, obj_id, ip_address): 
+    def remove_ip_entry(self, obj_id, ip_address, verify=False):
         """remove given ip entry from object
             Args:
                 obj_id: ``int``: Object ID of i-doit object to remove IPs from
                 ip_address: ``str``: IP to remove
+                verify: ``bool``: Read category again to verify the entry is gone.
             Returns:
-                json rpc response                
+                json rpc response of the purge or None if object has no entry with this IP
+            Raise:
+                ValueError: Purge of the entry failed.
         """
-        res = self.get_category_from_object(obj_id, 'C__CATG__IP')              # DEBUG
-        self.log.info("Switch ip: \n{}".format(pformat(res)))                   # DEBUG
-        for i in res['result']:
-            if ip_address == i['hostaddress']['ref_title']:
-                self.log.info("purge_object i: {}".format(pformat(i)))         # DEBUG
-                res = self.purge_object(obj_id, 'C__CATG__IP', i)
-                self.log.info("purge_object res: \n{}\n".format(pformat(res)))
-                break
-
-        stat = self.get_category_from_object(obj_id, 'C__CATG__IP')              # DEBUG
-        self.log.info("Switch ip: \n{}".format(pformat(stat)))                   # DEBUG
-        return res
+        ip_entrys = self.remove_ip_addresses({obj_id: [ip_address]}, verify=verify, first_match=True)[int(obj_id)]
+        self._raise_on_failed_purge(obj_id, ip_entrys)
+        for ie in ip_entrys:
+            return ie['result']
+        return None
+
+    def _raise_on_failed_purge(self, obj_id, ip_entrys):
+        """Raise ValueError for the first entry of remove_ip_addresses() that was not purged"""
+        for ie in ip_entrys:
+            if not ie['purged']:
+                r = ie['result']
+                if r is not None and 'error' in r:
+                    msg = r['error']['message']
+                elif r is None:
+                    msg = "No response"
+                else:
+                    msg = "Entry still exists"
+                raise ValueError("Purge of C__CATG__IP entry {} of object {} failed: {}".format(
+                                    ie['entry_id'], obj_id, msg))
+
+    def remove_ip_addresses(self, ips_by_obj, verify=False, first_match=False):
+        """remove ip entrys from many objects - one batched read, one batched purge
+            and one batched read if verify is True\n
+            - Uses: ``cmdb.category.read``, ``cmdb.category.purge``
+
+            Args:
+                ips_by_obj: ``dict``: {obj_id: list of IPs to remove or None to remove all entries}
+                verify: ``bool``: Read category again to verify the entries are gone.
+                first_match: ``bool``: Remove only the first entry of every IP, not all entries with it.
+            Returns:
+                Dict {obj_id: list of dicts with keys 'entry_id', 'ip', 'hostname', 'domain', 'is_primary',
+                'result' (json rpc response of purge) and 'purged' (``bool``)}
+        """
+        ips_by_obj = {int(k): v for k, v in ips_by_obj.items()}
+        current = self.get_categories_from_objects(list(ips_by_obj), 'C__CATG__IP')
+
+        ret = {}
+        purges = []
+        for obj_id, ips in ips_by_obj.items():
+            entries = current[obj_id]['C__CATG__IP']
+            if entries is None:
+                raise ValueError("Reading C__CATG__IP of object {} failed".format(obj_id))
+            ret[obj_id] = []
+            matched = set()
+            for i in entries:
+                ip = i['hostaddress']['ref_title'] if i.get('hostaddress') else None
+                if ips is not None and (ip not in ips or (first_match and ip in matched)):
+                    continue
+                matched.add(ip)
+                ie = {
+                    'entry_id': i['id'],
+                    'ip': ip,
+                    'hostname': i.get('hostname'),
+                    'domain': i.get('domain'),
+                    'is_primary': i['primary']['value'] if i.get('primary') else None,
+                }
+                ret[obj_id].append(ie)
+                purges.append((obj_id, ie))
+
+        res = self.send_batch_chunked([self.build_rpc('cmdb.category.purge',
+                                            {'object': o, 'category': 'C__CATG__IP', 'entry': int(ie['entry_id'])})
+                                        for o, ie in purges])
+        for (o, ie), r in zip(purges, res):
+            ie['result'] = r
+            ie['purged'] = r is not None and 'error' not in r
+
+        if verify and purges:
+            after = self.get_categories_from_objects(list({o for o, ie in purges}), 'C__CATG__IP')
+            for o, ie in purges:
+                entries = after[o]['C__CATG__IP'] or []
+                if str(ie['entry_id']) in [str(i['id']) for i in entries]:
+                    ie['purged'] = False
+        self.log.info("remove_ip_addresses: {} of {} entries purged".format(
+                        len([ie for o, ie in purges if ie['purged']]), len(purges)))
+        return ret
             
         # WORKS - reset ipv4 ip in hostadress to empty string
         """
@@ -796,9 +1493,21 @@ class IdoitAPI():
                 json rpc response
         """
         if not batch_request:
-            g_obj = self.get_category_from_object(obj_id,'C__CATG__GLOBAL')
+            g_obj = self.get_category_from_object(obj_id,'C__CATG__GLOBAL', use_mirror=False)
             self.log.warning("Changing category General on Object '{}'\n=> from:\n{}\n=> to:\n{}".format(
                                 obj_id, pformat(g_obj['result']), pformat(g_dict)))
+        values = self.general_values(g_dict)
+        ret = self.update_object_category(obj_id, 'C__CATG__GLOBAL', values, batch_request=batch_request)
+        return ret 
+
+    def general_values(self, g_dict):
+        """Build data dict for category 'C__CATG__GLOBAL' like set_general() - e.g. for reconcile_categories()
+
+            Args:
+                g_dict: ``dict``: Dictionary with vales to set, see set_general()
+            Returns:
+                Dict with keys 'title', 'cmdb_status' and 'description', 'category', 'purpose', 'tag' if set
+        """
         values = {
             'title': g_dict['title'],
             'cmdb_status': int(g_dict['cmdb_status']),
@@ -814,9 +1523,7 @@ class IdoitAPI():
             
         if g_dict.get('tag') and g_dict['tag'] != 'null':
             values.update({'tag': g_dict['tag']})
-
-        ret = self.update_object_category(obj_id, 'C__CATG__GLOBAL', values, batch_request=batch_request)
-        return ret 
+        return values
 
     def get_location(self, obj_id, batch_request=False):
         """Get title, location ID and path of location from an object
@@ -869,10 +1576,24 @@ class IdoitAPI():
             Returns:
                 Dict with keys 'title', 'id', 'location_path' or raise exception as returned by get_location()
         """
-        loc = self.get_location(from_obj_id)
-        res = self.set_location(to_obj_id, loc[1])
+        loc = self.extract_location(self.get_category_from_object(from_obj_id, 'C__CATG__LOCATION', use_mirror=False))
+        res = self.set_location(to_obj_id, loc['id'])
         return loc
 
+    def set_locations(self, moves):
+        """Set location of many objects with chunked batch requests
+
+            Args:
+                moves: ``dict``: {obj_id: location_id}
+            Returns:
+                Dict {obj_id: json rpc response}
+        """
+        moves = {int(o): l for o, l in moves.items()}
+        res = self.send_batch_chunked([self.build_rpc('cmdb.category.save',
+                                            {'object': o, 'category': 'C__CATG__LOCATION', 'data': {'parent': l}})
+                                        for o, l in moves.items()])
+        return dict(zip(moves, res))
+
     def get_contract_assignment(self, obj_id, batch_request=False):
         """Get contract assignment from an object
 
@@ -953,6 +1674,121 @@ class IdoitAPI():
                                             batch_request=batch_request)
         return res
 
+    def reconcile_categories(self, desired, dry_run=False):
+        """Idempotent upsert - compare desired category data with i-doit and save only fields that differ.
+            Current entries are read with chunked batch requests, saves are send the same way.
+
+            Data dicts are the same as written by the set_* methods, for example:
+                - 'C__CATG__GLOBAL': ``general_values(g_dict)``
+                - 'C__CATG__LOCATION': ``{'parent': location_id}``
+                - 'C__CATG__CONTRACT_ASSIGNMENT': ``{'connected_contract': contract_id}``
+                - 'C__CATG__IT_SERVICE': ``{'connected_object': service_id}``
+                - 'C__CATG__IP': ``{'ipv4_address': dev_ip, 'hostname': hostname, 'domain': fqdn}``
+
+            Multi value categories listed in ``RECONCILE_MATCH_FIELDS`` are matched by their key field,
+            e.g. an IP entry is updated if the IP address exists, else a new entry is created.
+            Other categories are compared with their first entry.
+
+            Args:
+                desired: ``dict``: {obj_id: {category: data_dict or list of data_dicts}}
+                dry_run: ``bool``: Only compare, don't save anything.
+            Returns:
+                List of dicts with keys 'obj_id', 'category', 'entry', 'action' ('unchanged', 'update' or 'create'),
+                'changes' ({field: (current, desired)}) and 'result' (JSON-RPC response of save or None).
+        """
+        todo = []
+        for obj_id, cats in desired.items():
+            for category, data in cats.items():
+                for d in (data if isinstance(data, list) else [data]):
+                    todo.append((int(obj_id), category, d))
+
+        pairs = list(dict.fromkeys((o, c) for o, c, d in todo))
+        res = self.send_batch_chunked([self.build_rpc('cmdb.category.read', {'category': c, 'objID': o})
+                                        for o, c in pairs])
+        current = {}
+        for pair, r in zip(pairs, res):
+            if r is None or 'error' in r:
+                raise ValueError("Reading {} of object {} failed: {}".format(pair[1], pair[0], r))
+            current[pair] = r['result']
+
+        report = []
+        saves = []
+        for obj_id, category, data in todo:
+            entries = current[(obj_id, category)]
+            match_field = self.RECONCILE_MATCH_FIELDS.get(category)
+            entry = None
+            if match_field and match_field in data:
+                for e in entries:
+                    if self._reconcile_value_equal(data[match_field], self._reconcile_read(e, category, match_field)):
+                        entry = e
+                        break
+            elif not match_field and entries:
+                entry = entries[0]
+
+            if entry is None:
+                changes = {k: (None, v) for k, v in data.items()}
+                rep = {'obj_id': obj_id, 'category': category, 'entry': None, 'action': 'create'}
+            else:
+                changes = {}
+                for k, v in data.items():
+                    cur = self._reconcile_read(entry, category, k)
+                    if not self._reconcile_value_equal(v, cur):
+                        changes[k] = (cur, v)
+                rep = {'obj_id': obj_id, 'category': category, 'entry': int(entry['id']),
+                        'action': 'update' if changes else 'unchanged'}
+            rep.update({'changes': changes, 'result': None})
+            report.append(rep)
+
+            if changes and not dry_run:
+                p = {'object': obj_id, 'category': category, 'data': {k: v[1] for k, v in changes.items()}}
+                if rep['entry'] is not None:
+                    p['entry'] = rep['entry']
+                saves.append((rep, self.build_rpc('cmdb.category.save', p)))
+
+        for (rep, data), r in zip(saves, self.send_batch_chunked([d for rep, d in saves])):
+            rep['result'] = r
+        self.log.info("reconcile_categories: {} entries compared, {} saves send".format(len(report), len(saves)))
+        return report
+
+    def _reconcile_read(self, entry, category, field):
+        """Value of field in entry as read by cmdb.category.read, considers RECONCILE_READ_ALIASES"""
+        if field in entry:
+            return entry[field]
+        alias = self.RECONCILE_READ_ALIASES.get(category, {}).get(field)
+        return entry.get(alias) if alias else None
+
+    def _reconcile_value_equal(self, value, current):
+        """Compare value as written by cmdb.category.save with value as read by cmdb.category.read
+
+            Read values are often dicts (dialog fields, object references) or lists of dicts (tags),
+            they are reduced to 'id', 'value', 'ref_title' or 'title'. Constants match the key 'const'.
+        """
+        if isinstance(current, dict):
+            if isinstance(value, str) and value == current.get('const'):
+                return True
+            for k in ('id', 'value', 'ref_title', 'title'):
+                if k in current:
+                    return self._reconcile_value_equal(value, current[k])
+            return False
+        if isinstance(current, list) or isinstance(value, list):
+            values = value if isinstance(value, list) else [value]
+            currents = current if isinstance(current, list) else [current]
+            if len(values) != len(currents):
+                return False
+            # order of list entries doesn't matter, e.g. tags
+            rest = list(currents)
+            for v in values:
+                for c in rest:
+                    if self._reconcile_value_equal(v, c):
+                        rest.remove(c)
+                        break
+                else:
+                    return False
+            return True
+        if value is None or current is None:
+            return value in (None, '') and current in (None, '')
+        return str(value) == str(current)
+
     def get_all_os(self):
         """Get a list of all available operating systems
 
@@ -1059,6 +1895,201 @@ class IdoitAPI():
 
         return d
 
+    def find_host_ip_serial_bulk(self, records, chunk_size=None, max_workers=None, index=None):
+        """Like find_host_ip_serial() for many sets of hostname, IP address and serial number.
+            Each distinct term is searched once, the searches are send as chunked, concurrent batch requests.
+
+            Args:
+                records: ``iterable``: Tuples (host, ip_addr, serial), entries might be empty
+                chunk_size: ``int``: Searches per batch request, default ``batch_chunk_size``
+                max_workers: ``int``: Batch requests send concurrently, default ``batch_max_workers``
+                index: ``SearchIndex``: Local index (idoitIndex.py) asked first, only misses are searched in i-doit
+            Returns:
+                List with one dictionary per record - given host, IP, serial as keys and a list of object IDs
+                with matching results as value. Only keys with search results will be present.
+        """
+        records = [tuple(r) for r in records]
+        terms = list(dict.fromkeys(t for r in records for t in r if t))
+
+        found = {}
+        if index is not None:
+            for t in terms:
+                ids = index.lookup(t)
+                if ids:
+                    found[t] = ids
+
+        todo = [t for t in terms if t not in found]
+        res = self.send_batch_chunked([self.build_rpc('idoit.search', {'q': t}) for t in todo],
+                                        chunk_size=chunk_size, max_workers=max_workers)
+        for t, r in zip(todo, res):
+            if r is None or 'error' in r:
+                self.log.error("find_host_ip_serial_bulk: search for '{}' failed: {}".format(t, r))
+                continue
+            ids = list(dict.fromkeys(x['documentId'] for x in r['result']))
+            if ids:
+                found[t] = ids
+        self.log.info("find_host_ip_serial_bulk: {} records, {} distinct terms, {} searched in i-doit".format(
+                        len(records), len(terms), len(todo)))
+
+        return [{t: found[t] for t in r if t and t in found} for r in records]
+
+    def connect_ports_bulk(self, pairs):
+        """Connect ports of objects with a cable - port titles of all objects are resolved with one
+            batched read, all connections are written with one chunked batch request.\n
+            - Uses: ``cmdb.category.read``, ``cmdb.category.save`` 'C__CATG__CONNECTOR'
+
+            Args:
+                pairs: ``iterable``: Tuples (obj_id_a, port_title_a, obj_id_b, port_title_b)
+            Returns:
+                List of dicts per pair with keys 'obj_a', 'port_a', 'obj_b', 'port_b', 'connector_a',
+                'connector_b' (entry IDs or None), 'success' (``bool``), 'error' and 'result' (json rpc response)
+        """
+        pairs = [(int(a), pa, int(b), pb) for a, pa, b, pb in pairs]
+        obj_ids = list(dict.fromkeys(o for a, pa, b, pb in pairs for o in (a, b)))
+
+        titles = {}
+        for obj_id, cats in self.get_categories_from_objects(obj_ids, 'C__CATG__CONNECTOR').items():
+            for i in cats['C__CATG__CONNECTOR'] or []:
+                titles.setdefault((obj_id, i['title']), int(i['id']))      # first match like connect_ports()
+
+        report = []
+        saves = []
+        for a, pa, b, pb in pairs:
+            rep = {'obj_a': a, 'port_a': pa, 'obj_b': b, 'port_b': pb,
+                    'connector_a': titles.get((a, pa)), 'connector_b': titles.get((b, pb)),
+                    'success': False, 'error': None, 'result': None}
+            report.append(rep)
+            if rep['connector_a'] is None or rep['connector_b'] is None:
+                rep['error'] = "Port '{}' of object {} not found".format(*((pa, a) if rep['connector_a'] is None else (pb, b)))
+                continue
+            saves.append((rep, self.build_rpc('cmdb.category.save',
+                                                {'object': a, 'category': 'C__CATG__CONNECTOR',
+                                                'entry': rep['connector_a'],
+                                                'data': {'assigned_connector': rep['connector_b']}})))
+
+        for (rep, data), r in zip(saves, self.send_batch_chunked([d for rep, d in saves])):
+            rep['result'] = r
+            rep['success'] = r is not None and 'error' not in r
+            if not rep['success']:
+                rep['error'] = r['error']['message'] if r else "No response"
+        self.log.info("connect_ports_bulk: {} of {} pairs connected".format(
+                        len([r for r in report if r['success']]), len(report)))
+        return report
+
+    def create_mass_change_template(self, obj_type, title, categories):
+        """Create an object with the given categories and mark it as mass change template
+
+            Args:
+                obj_type: ``str``: Object type constant
+                title: ``str``: Title of template
+                categories: ``dict``: {category: list of entries} - only filled fields are applied later
+            Returns:
+                Object ID of the template
+        """
+        res = self.create_object_by_type(obj_type, title=title, categories=categories)
+        obj_id = int(res['result']['id'])
+        self.mark_as_mass_change_template(obj_id)
+        return obj_id
+
+    def apply_mass_change(self, obj_ids, categories=None, template_id=None, only_changed=True,
+                            objects_per_step=1000, progress=None):
+        """Apply category values to many objects like an i-doit mass change.
+
+            The JSON-RPC API has no method to run a mass change, so the values of the template (or the
+            given categories) are written by the client: with only_changed=True via reconcile_categories()
+            which saves only differing fields, else with chunked batch requests of ``cmdb.category.save``.
+            As in i-doit only filled fields of the template are applied.\n
+            - Uses: ``cmdb.category.read``, ``cmdb.category.save``
+
+            Args:
+                obj_ids: ``iterable``: Object IDs of i-doit objects to change
+                categories: ``dict``: {category: data_dict or list of data_dicts} - values to set, or with
+                    template_id a ``list`` of the categories to read from the template
+                template_id: ``int``: Object ID of a mass change template, see ``read_mass_change_template()``
+                only_changed: ``bool``: Compare with current values and only save differences.
+                objects_per_step: ``int``: Objects processed per step, progress is reported after each step
+                progress: ``callable``: Called with (done, total) objects after each step
+            Returns:
+                List of dicts per saved or compared entry like reconcile_categories(), 'action' is 'save'
+                if only_changed is False.
+        """
+        if template_id is not None:
+            if not isinstance(categories, (list, tuple)) or not categories:
+                raise ValueError("apply_mass_change() with template_id needs a list of categories")
+            categories = self.read_mass_change_template(template_id, categories)
+        elif not isinstance(categories, dict):
+            raise ValueError("apply_mass_change() needs a dict of categories or template_id")
+
+        obj_ids = list(dict.fromkeys(int(o) for o in obj_ids))
+        report = []
+        for n in range(0, len(obj_ids), objects_per_step):
+            step = obj_ids[n:n+objects_per_step]
+            if only_changed:
+                report.extend(self.reconcile_categories({o: categories for o in step}))
+            else:
+                saves = []
+                for o in step:
+                    for category, data in categories.items():
+                        for d in (data if isinstance(data, list) else [data]):
+                            rep = {'obj_id': o, 'category': category, 'entry': None, 'action': 'save',
+                                    'changes': {k: (None, v) for k, v in d.items()}, 'result': None}
+                            saves.append((rep, self.build_rpc('cmdb.category.save',
+                                                                {'object': o, 'category': category, 'data': d})))
+                for (rep, data), r in zip(saves, self.send_batch_chunked([d for rep, d in saves])):
+                    rep['result'] = r
+                    report.append(rep)
+            if progress:
+                progress(min(n + objects_per_step, len(obj_ids)), len(obj_ids))
+        return report
+
+    def read_mass_change_template(self, template_id, categories):
+        """Read filled fields of a mass change template as data dicts for cmdb.category.save.
+            Fields read with another name are renamed (``RECONCILE_READ_ALIASES``), read-only fields
+            ('primary_*') are dropped.
+
+            Args:
+                template_id: ``int``: Object ID of template
+                categories: ``list``: Categories to read - name them explicitly, categories like logbook,
+                    relations or overview must not be applied to other objects
+            Returns:
+                Dict {category: data_dict or list of data_dicts (categories in RECONCILE_MATCH_FIELDS)}
+        """
+        ret = {}
+        for category, entries in self.get_categories_from_objects([template_id], categories)[int(template_id)].items():
+            data = [self._template_entry_data(category, e) for e in entries or []]
+            data = [d for d in data if d]
+            if not data:
+                continue
+            ret[category] = data if category in self.RECONCILE_MATCH_FIELDS else data[0]
+        # title, sysid etc. belong to the template object itself
+        if 'C__CATG__GLOBAL' in ret:
+            for k in ('title', 'status', 'sysid', 'created', 'created_by', 'changed', 'changed_by', 'type'):
+                ret['C__CATG__GLOBAL'].pop(k, None)
+        return ret
+
+    def _template_entry_data(self, category, entry):
+        """Reduce a category entry as read by cmdb.category.read to filled fields as written by cmdb.category.save"""
+        write_names = {read: write for write, read in self.RECONCILE_READ_ALIASES.get(category, {}).items()}
+        data = {}
+        for k, v in entry.items():
+            if k in ('id', 'objID') or k.startswith('primary_'):
+                continue
+            if isinstance(v, dict):
+                v = self._template_value(v)
+            elif isinstance(v, list):
+                v = [self._template_value(x) if isinstance(x, dict) else x for x in v]
+                v = [x for x in v if x is not None]
+            if v not in (None, '', []):
+                data[write_names.get(k, k)] = v
+        return data
+
+    def _template_value(self, value):
+        """Value of a read dict (dialog field, object reference) as written, like ``_reconcile_value_equal()``"""
+        for k in ('id', 'value', 'ref_title', 'title'):
+            if k in value:
+                return value[k]
+        return None
+
     def find_rack(self, r_title):
         """Query i-doit for an object type 'enclosure' with a given title
             Args:
@@ -1067,3 +2098,269 @@ class IdoitAPI():
                 JSON object of response or raise exception.
         """
         return self.get_objects_by_type('C__OBJTYPE__ENCLOSURE', title=r_title)
+
+    def find_racks(self, r_titles):
+        """Query i-doit for objects of type 'enclosure' with given titles in chunked batch requests
+            Args:
+                r_titles: ``list``: Enclosure titles
+            Returns:
+                Dict {title: list of enclosure objects}, the list is empty if no enclosure matched.
+        """
+        r_titles = list(dict.fromkeys(r_titles))
+        res = self.send_batch_chunked([self.build_rpc('cmdb.objects.read',
+                                            {'filter': {'type': 'C__OBJTYPE__ENCLOSURE', 'status': 2, 'title': t}})
+                                        for t in r_titles])
+        return {t: (r or {}).get('result') or [] for t, r in zip(r_titles, res)}
+
+    def get_rack_inventory(self, r_titles=None, rack_ids=None):
+        """Occupancy of racks - which devices sit at which rack unit, with form factor and status.
+            Needs three rounds of batch requests independent of the number of racks:
+            find the racks, read their content and form factor, read location, form factor and
+            general category of all contained objects.\n
+            - Uses: ``cmdb.objects.read``, ``cmdb.location_tree``, ``cmdb.category.read``
+
+            Args:
+                r_titles: ``list``: Enclosure titles
+                rack_ids: ``list``: Object IDs of enclosures, alternative to r_titles
+            Returns:
+                Dict {rack_id: occupancy} with occupancy as returned by extract_rack_occupancy()
+        """
+        racks = {}
+        for t, objs in self.find_racks(r_titles or []).items():
+            for o in objs:
+                racks[int(o['id'])] = o['title']
+        for r in rack_ids or []:
+            racks.setdefault(int(r), None)
+        rack_lst = list(racks)
+
+        data = []
+        for r in rack_lst:
+            data.append(self.build_rpc('cmdb.location_tree', {'id': r}))
+            data.append(self.build_rpc('cmdb.category.read', {'category': 'C__CATG__FORMFACTOR', 'objID': r}))
+        res = self.send_batch_chunked(data)
+
+        content = {}
+        rack_ff = {}
+        for n, r in enumerate(rack_lst):
+            content[r] = (res[2*n] or {}).get('result') or []
+            rack_ff[r] = (res[2*n+1] or {}).get('result') or []
+        obj_ids = list(dict.fromkeys(int(o['id']) for objs in content.values() for o in objs))
+        cats = self.get_categories_from_objects(obj_ids, ['C__CATG__LOCATION', 'C__CATG__FORMFACTOR', 'C__CATG__GLOBAL'])
+
+        ret = {}
+        for r in rack_lst:
+            ret[r] = self.extract_rack_occupancy({'id': r, 'title': racks[r]}, rack_ff[r], content[r], cats)
+        return ret
+
+    def extract_rack_occupancy(self, rack, rack_formfactor, content, categories):
+        """Build occupancy of a rack => to be used with get_rack_inventory()
+
+            Args:
+                rack: ``dict``: Rack with keys 'id' and 'title'
+                rack_formfactor: ``list``: 'result' of 'C__CATG__FORMFACTOR' of the rack
+                content: ``list``: 'result' of ``cmdb.location_tree`` of the rack
+                categories: ``dict``: {obj_id: {category: entries}} of 'C__CATG__LOCATION', 'C__CATG__FORMFACTOR'
+                    and 'C__CATG__GLOBAL' as returned by get_categories_from_objects()
+            Returns:
+                Dict with keys 'id', 'title', 'rackunits', 'devices' (list of dicts with keys 'id', 'title', 'pos',
+                'height', 'insertion', 'option', 'formfactor', 'cmdb_status'), 'front' and 'back' (list with object
+                ID or None per rack unit, index 0 = unit 1), 'used_units', 'free_units' and 'unplaced'
+                (object IDs without position, e.g. vertical mounted).
+        """
+        def ref(value, key='title'):
+            # dialog fields are read as dict, sometimes as list of dicts
+            if isinstance(value, list):
+                value = value[0] if value else None
+            if isinstance(value, dict):
+                return value.get(key)
+            return value
+
+        rackunits = int(rack_formfactor[0].get('rackunits') or 0) if rack_formfactor else 0
+        ret = {'id': rack['id'], 'title': rack['title'], 'rackunits': rackunits, 'devices': [],
+                'front': [None] * rackunits, 'back': [None] * rackunits, 'unplaced': []}
+
+        for o in content:
+            obj_id = int(o['id'])
+            cats = categories.get(obj_id, {})
+            loc = (cats.get('C__CATG__LOCATION') or [{}])[0]
+            ff = (cats.get('C__CATG__FORMFACTOR') or [{}])[0]
+            glob = (cats.get('C__CATG__GLOBAL') or [{}])[0]
+
+            pos = loc.get('pos')
+            if isinstance(pos, dict):
+                pos = pos.get('visually_from') or pos.get('title')
+            pos = int(pos) if pos not in (None, '', 0, '0') else None
+            height = int(ff.get('rackunits') or 1)
+            insertion = ref(loc.get('insertion'), 'id')
+            dev = {
+                'id': obj_id,
+                'title': o.get('title'),
+                'pos': pos,
+                'height': height,
+                'insertion': int(insertion) if insertion not in (None, '') else None,
+                'option': ref(loc.get('option')),
+                'formfactor': ref(ff.get('formfactor')),
+                'cmdb_status': ref(glob.get('cmdb_status')),
+            }
+            ret['devices'].append(dev)
+
+            if pos is None or str(dev['option']).lower() == 'vertical':
+                ret['unplaced'].append(obj_id)
+                continue
+            # insertion: 0 = back, 1 = front, 2 = both
+            sides = {0: ['back'], 1: ['front']}.get(dev['insertion'], ['front', 'back'])
+            for ru in range(pos, pos + height):
+                if 1 <= ru <= rackunits:
+                    for side in sides:
+                        ret[side][ru - 1] = obj_id
+
+        ret['used_units'] = len([n for n in range(rackunits) if ret['front'][n] or ret['back'][n]])
+        ret['free_units'] = rackunits - ret['used_units']
+        return ret
+
+
+class AutoBatch():
+    """Write-behind queue for mutating JSON-RPC requests, use ``IdoitAPI.auto_batch()`` to create one.
+
+    Args:
+        api: ``IdoitAPI``: API instance to send the batch requests with
+        max_size: ``int``: Flush when this many requests are queued.
+        max_delay: ``float``: Flush when the oldest queued request is older than this (seconds).
+        coalesce: ``bool``: Merge ``cmdb.category.save`` requests for the same object, category and entry.
+        coalesce_categories: ``tuple``: Single value categories whose saves without entry ID may be merged,
+            default ``COALESCE_CATEGORIES``.
+
+    Attributes:
+        results: ``list``: Tuples (request, response) of all flushed requests in the order they were queued.
+        flush_count: ``int``: Number of batch requests send to i-doit.
+        merged: ``int``: Number of requests that have been merged into an already queued request.
+        dropped: ``list``: Queued requests not send because the ``with`` block raised an exception -
+            writes of a half-finished block are not applied to the CMDB.
+        COALESCE_CATEGORIES: ``tuple``: Categories with only one entry per object. A save without entry ID
+            updates this entry, on multi value categories like ``C__CATG__IP`` it creates a new one.
+    """
+
+    COALESCE_CATEGORIES = (
+        'C__CATG__GLOBAL',
+        'C__CATG__LOCATION',
+        'C__CATG__FORMFACTOR',
+        'C__CATG__MODEL',
+        'C__CATG__ACCOUNTING',
+    )
+
+    def __init__(self, api, max_size=500, max_delay=2.0, coalesce=False, coalesce_categories=None):
+        self.api = api
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.coalesce = coalesce
+        if coalesce_categories is None:
+            self.coalesce_categories = self.COALESCE_CATEGORIES
+        else:
+            self.coalesce_categories = tuple(coalesce_categories)
+
+        self.queue = []
+        self.results = []
+        self.flush_count = 0
+        self.merged = 0
+        self.dropped = []
+        self._pending = {}              # (object, category, entry) => queued cmdb.category.save request
+        self._first_queued = None       # time.monotonic() of oldest queued request
+        self._parent = None             # AutoBatch active before entering this one
+
+    def __enter__(self):
+        self._parent = self.api._auto_batch
+        self.api._auto_batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.api._auto_batch = self._parent
+        if exc_type is not None:
+            self.drop()
+            return False
+        self.flush()
+        return False
+
+    def drop(self):
+        """Discard all queued requests without sending them, they are moved to ``dropped``"""
+        if self.queue:
+            self.api.log.warning("AutoBatch: {} queued writes dropped, not send to i-doit".format(len(self.queue)))
+        self.dropped.extend(self.queue)
+        self.queue = []
+        self._pending = {}
+        self._first_queued = None
+
+    def add(self, data):
+        """Queue a JSON-RPC request and flush if a threshold is reached
+
+            Args:
+                data: ``dict``: JSON-RPC request as build by ``IdoitAPI.send_rpc()``
+            Returns:
+                The queued request, like ``send_rpc()`` with ``batch_request=True``.
+                If the request was merged the already queued request is returned.
+        """
+        if self.coalesce:
+            queued = self._coalesce(data)
+            if queued is not None:
+                return queued
+
+        data['id'] = len(self.queue)+1
+        self.queue.append(data)
+        if self._first_queued is None:
+            self._first_queued = time.monotonic()
+
+        if len(self.queue) >= self.max_size:
+            self.flush()
+        elif self.max_delay is not None and time.monotonic() - self._first_queued >= self.max_delay:
+            self.flush()
+        return data
+
+    def flush(self):
+        """Send all queued requests as one batch request
+
+            Returns:
+                Dictionary with JSON-RPC request IDs as keys like ``send_batch()``, empty if nothing was queued.
+        """
+        if not self.queue:
+            return {}
+        queue = self.queue
+        self.queue = []
+        self._pending = {}
+        self._first_queued = None
+
+        res = self.api.send_rpc_d(queue, True)
+        self.flush_count += 1
+        for data in queue:
+            self.results.append((data, res.get(data['id'])))
+        return res
+
+    def _coalesce(self, data):
+        """Merge request into a queued ``cmdb.category.save`` with the same key, last write per field wins
+
+            Returns:
+                The queued request data was merged into or None if data has to be queued.
+        """
+        params = data['params']
+        if data['method'] == 'cmdb.category.save' and \
+                ('entry' in params or params['category'] in self.coalesce_categories):
+            key = (params['object'], params['category'], params.get('entry'))
+            queued = self._pending.get(key)
+            if queued is not None:
+                queued['params']['data'].update(params['data'])
+                self.merged += 1
+                return queued
+            params['data'] = dict(params['data'])      # don't change the dict of the caller on merge
+            self._pending[key] = data
+            return None
+
+        # keep order of other requests for this object (and category), later saves must not be merged across them
+        obj = params.get('object', params.get('id', params.get('objID')))
+        if 'category' in params:
+            self._pending = {k: v for k, v in self._pending.items() if k[:2] != (obj, params['category'])}
+        else:
+            self._pending = {k: v for k, v in self._pending.items() if k[0] != obj}
+        return None
+
+    @property
+    def errors(self):
+        """List of tuples (request, response) of flushed requests that returned an error"""
+        return [(req, res) for req, res in self.results if res is None or 'error' in res]
@@ -0,0 +1,150 @@
+"""Local index of hostnames, FQDNs, IPv4 addresses and serial numbers to answer searches without i-doit"""
+import bisect
+import logging
+import time
+
+
+class SearchIndex():
+    """Inverted index term => object IDs, built from 'C__CATG__IP' and 'C__CATG__MODEL' of all objects.
+
+    Indexed terms are the object title, hostname, FQDN (hostname.domain), IPv4 address and serial number,
+    all lower case. ``find_host_ip_serial()`` answers like ``IdoitAPI.find_host_ip_serial()`` and only
+    asks i-doit for terms that are not in the index.
+
+    Example:
+        ``index = SearchIndex(api, ['C__OBJTYPE__SWITCH', 'C__OBJTYPE__SERVER'], refresh_interval=3600)``
+        ``index.find_host_ip_serial('swinfrab', '10.20.0.4')``
+
+    Args:
+        api: ``IdoitAPI``: API instance to read from
+        obj_types: ``list``: Object type constants to index, None = all objects
+        refresh_interval: ``float``: Rebuild index on lookup when it is older (seconds), None = never
+        page_size: ``int``: Objects per ``cmdb.objects.read`` request
+
+    Attributes:
+        CATEGORIES: ``list``: Categories read to build the index.
+    """
+
+    CATEGORIES = ['C__CATG__IP', 'C__CATG__MODEL']
+
+    def __init__(self, api, obj_types=None, refresh_interval=3600, page_size=1000):
+        self.log = logging.getLogger(__name__)
+        self.api = api
+        self.obj_types = obj_types
+        self.refresh_interval = refresh_interval
+        self.page_size = page_size
+
+        self._terms = {}            # term => list of object IDs (str, like documentId of idoit.search)
+        self._sorted = []           # sorted terms for prefix search
+        self.built_at = None        # time.monotonic() of last refresh()
+
+    def refresh(self):
+        """(Re)build the index from i-doit\n
+            - Uses: ``cmdb.objects.read``
+
+            Returns:
+                Number of indexed terms.
+        """
+        if self.obj_types:
+            filters = [{'type': t, 'status': 2} for t in self.obj_types]
+        else:
+            filters = [{'status': 2}]
+
+        terms = {}
+        for f in filters:
+            for o in self.api.get_all_objects(f, categories=self.CATEGORIES, page_size=self.page_size):
+                for t in self.extract_terms(o):
+                    ids = terms.setdefault(t, [])
+                    if str(o['id']) not in ids:
+                        ids.append(str(o['id']))
+
+        # replace in one step, lookups of other threads see the old or the new index
+        self._terms, self._sorted = terms, sorted(terms)
+        self.built_at = time.monotonic()
+        self.log.info("SearchIndex: {} terms indexed".format(len(terms)))
+        return len(terms)
+
+    def extract_terms(self, obj):
+        """Terms to index of an object as returned by ``cmdb.objects.read`` with categories
+
+            Args:
+                obj: ``dict``: Object with key 'categories'
+            Returns:
+                Set of lower case terms.
+        """
+        terms = set()
+        if obj.get('title'):
+            terms.add(obj['title'])
+        cats = obj.get('categories') or {}
+        for ip in cats.get('C__CATG__IP') or []:
+            for k in ('ipv4_address', 'hostaddress'):
+                if isinstance(ip.get(k), dict) and ip[k].get('ref_title'):
+                    terms.add(ip[k]['ref_title'])
+            if ip.get('hostname'):
+                terms.add(ip['hostname'])
+                if ip.get('domain'):
+                    terms.add("{}.{}".format(ip['hostname'], ip['domain']))
+        for model in cats.get('C__CATG__MODEL') or []:
+            if model.get('serial'):
+                terms.add(model['serial'])
+        return {str(t).strip().lower() for t in terms if str(t).strip()}
+
+    def _ensure_fresh(self):
+        if self.built_at is None or (self.refresh_interval is not None and
+                                    time.monotonic() - self.built_at > self.refresh_interval):
+            self.refresh()
+
+    def lookup(self, term, prefix=False):
+        """Object IDs for a term
+
+            Args:
+                term: ``str``: hostname, FQDN, IP address or serial number
+                prefix: ``bool``: Match all terms starting with term
+            Returns:
+                List of object IDs, empty if nothing matched.
+        """
+        self._ensure_fresh()
+        term = term.strip().lower()
+        if not prefix:
+            return list(self._terms.get(term, []))
+
+        terms, keys = self._terms, self._sorted
+        ret = []
+        seen = set()
+        n = bisect.bisect_left(keys, term)
+        while n < len(keys) and keys[n].startswith(term):
+            for i in terms[keys[n]]:
+                if i not in seen:
+                    seen.add(i)
+                    ret.append(i)
+            n += 1
+        return ret
+
+    def find_host_ip_serial(self, host=None, ip_addr=None, serial=None, prefix=False, fallback=True):
+        """Like ``IdoitAPI.find_host_ip_serial()`` but answered from the index
+
+            Args:
+                host: ``str``: hostname to look for, might be empty
+                ip_addr: ``str``: ip address to look for, might be empty
+                serial: ``str``: serial number to look for, might be empty
+                prefix: ``bool``: Match all terms starting with the given ones
+                fallback: ``bool``: Ask i-doit for terms without match in the index
+            Returns:
+                Dictionary with given host, IP, serial as keys and a list of object IDs
+                with matching results as value. Only keys with search results will be present.
+        """
+        d = {}
+        missed = {}
+        for k, term in (('host', host), ('ip_addr', ip_addr), ('serial', serial)):
+            if not term:
+                continue
+            ids = self.lookup(term, prefix)
+            if ids:
+                d[term] = ids
+            else:
+                missed[k] = term
+
+        if fallback and missed:
+            for term, ids in self.api.find_host_ip_serial(**missed).items():
+                d[term] = ids if isinstance(ids, list) else [ids]
+        return d
@@ -0,0 +1,524 @@
+"""Client side metrics of IdoitAPI - per JSON-RPC method call counts, errors, latency and bytes
+
+Enable with ``api.enable_metrics()``, read with ``api.metrics.snapshot()`` or export for Prometheus with
+``api.metrics.to_prometheus()``.
+
+``PhaseProfiler`` splits the time of calls into phases, enable it with ``api.enable_profiler()`` and
+print ``api.profiler.report()``.
+
+``DebugRing`` keeps the last request/response pairs in memory and writes them to a file when a call
+fails, enable it with ``api.enable_debug_ring()``.
+"""
+import functools
+import json
+import os
+import random
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from collections import deque
+
+
+# upper bounds of latency histogram buckets (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# upper bounds of batch size histogram buckets (JSON-RPC requests per batch)
+BATCH_BUCKETS = (1, 10, 50, 100, 250, 500, 1000)
+
+
+class Histogram():
+    """Cumulative histogram like a Prometheus histogram
+
+    Args:
+        buckets: ``tuple``: Sorted upper bounds, a '+Inf' bucket is added
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """List of (upper bound as str, cumulative count)"""
+        res = []
+        total = 0
+        for le, c in zip(list(self.buckets) + ['+Inf'], self.counts):
+            total += c
+            res.append((str(le), total))
+        return res
+
+    def snapshot(self):
+        return {'buckets': dict(self.cumulative()), 'sum': self.sum, 'count': self.count}
+
+
+class MethodStats():
+    """Counters of one JSON-RPC method"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.request_saved_bytes = 0
+        self.response_saved_bytes = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+
+    def snapshot(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'retries': self.retries,
+            'request_bytes': self.request_bytes,
+            'response_bytes': self.response_bytes,
+            'request_saved_bytes': self.request_saved_bytes,
+            'response_saved_bytes': self.response_saved_bytes,
+            'latency_seconds': self.latency.snapshot(),
+        }
+
+
+class ClientMetrics():
+    """Metrics recorded by ``IdoitAPI._post()`` for every HTTP request.
+
+    A single request is counted under its JSON-RPC method with latency and bytes of the HTTP request.
+    Bytes are counted as transferred, the bytes saved by compression are counted separately.
+    A batch request is counted under the method 'batch' with latency and bytes, its size goes to the
+    batch size histogram and every contained request counts as call (and error) of its own method.
+    An error is a JSON-RPC error response, an HTTP error status or an exception of the transport.
+
+    Attributes:
+        methods: ``dict``: method => ``MethodStats``
+        batch_size: ``Histogram``: JSON-RPC requests per batch request
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Remove all recorded values"""
+        with self._lock:
+            self.methods = {}
+            self.batch_size = Histogram(BATCH_BUCKETS)
+
+    def _stats(self, method):
+        stats = self.methods.get(method)
+        if stats is None:
+            stats = self.methods[method] = MethodStats()
+        return stats
+
+    def record(self, data, res, seconds, request_bytes, response_bytes, status_code=200, request_saved_bytes=0,
+               response_saved_bytes=0):
+        """Record a sent request
+
+            Args:
+                data: ``dict / list``: JSON-RPC request or batch request
+                res: ``dict / list / None``: Decoded response
+                seconds: ``float``: Latency of the HTTP request
+                request_bytes: ``int``: Size of the HTTP request body
+                response_bytes: ``int``: Size of the HTTP response body
+                status_code: ``int``: HTTP status code
+                request_saved_bytes: ``int``: Uncompressed minus compressed size of the request body
+                response_saved_bytes: ``int``: Uncompressed minus compressed size of the response body
+        """
+        http_error = status_code >= 400
+        with self._lock:
+            if isinstance(data, list):
+                errors = {}
+                if isinstance(res, list):
+                    errors = {r.get('id'): 'error' in r for r in res if isinstance(r, dict)}
+                for d in data:
+                    stats = self._stats(d.get('method'))
+                    stats.calls += 1
+                    if http_error or errors.get(d.get('id'), True):
+                        stats.errors += 1
+                self.batch_size.observe(len(data))
+                stats = self._stats('batch')
+                if http_error or not isinstance(res, list):
+                    stats.errors += 1
+            else:
+                stats = self._stats(data.get('method'))
+                if http_error or (isinstance(res, dict) and 'error' in res):
+                    stats.errors += 1
+            stats.calls += 1
+            stats.request_bytes += request_bytes
+            stats.response_bytes += response_bytes
+            stats.request_saved_bytes += request_saved_bytes
+            stats.response_saved_bytes += response_saved_bytes
+            stats.latency.observe(seconds)
+
+    def record_failure(self, data, seconds, request_bytes):
+        """Record a request that raised an exception (connection error, undecodable response)"""
+        with self._lock:
+            methods = [d.get('method') for d in data] if isinstance(data, list) else [data.get('method')]
+            if isinstance(data, list):
+                self.batch_size.observe(len(data))
+                methods.append('batch')
+            for method in methods:
+                stats = self._stats(method)
+                stats.calls += 1
+                stats.errors += 1
+            stats.request_bytes += request_bytes
+            stats.latency.observe(seconds)
+
+    def record_retry(self, method, count=1):
+        """Count a retry of method - for transports and callers that send a request again"""
+        with self._lock:
+            self._stats(method).retries += count
+
+    def snapshot(self):
+        """Current values as dict
+
+            Returns:
+                ``dict`` with keys 'methods' (method => dict of counters and 'latency_seconds' histogram)
+                and 'batch_size' (histogram). Histograms are dicts with keys 'buckets' (cumulative counts by
+                upper bound), 'sum' and 'count'.
+        """
+        with self._lock:
+            return {
+                'methods': {m: s.snapshot() for m, s in self.methods.items()},
+                'batch_size': self.batch_size.snapshot(),
+            }
+
+    def to_prometheus(self, prefix='idoit_client'):
+        """Current values in the Prometheus text exposition format
+
+            Args:
+                prefix: ``str``: Prefix of the metric names
+            Returns:
+                ``str``
+        """
+        lines = []
+
+        def counter(name, help_text, attr):
+            lines.append("# HELP {}_{} {}".format(prefix, name, help_text))
+            lines.append("# TYPE {}_{} counter".format(prefix, name))
+            for method in sorted(self.methods):
+                lines.append('{}_{}{{method="{}"}} {}'.format(prefix, name, method,
+                                                              getattr(self.methods[method], attr)))
+
+        def histogram(name, hist, labels=''):
+            sep = ',' if labels else ''
+            for le, c in hist.cumulative():
+                lines.append('{}_{}_bucket{{{}{}le="{}"}} {}'.format(prefix, name, labels, sep, le, c))
+            lines.append('{}_{}_sum{} {}'.format(prefix, name, '{' + labels + '}' if labels else '', hist.sum))
+            lines.append('{}_{}_count{} {}'.format(prefix, name, '{' + labels + '}' if labels else '', hist.count))
+
+        with self._lock:
+            counter('calls_total', "JSON-RPC requests sent", 'calls')
+            counter('errors_total', "JSON-RPC requests failed", 'errors')
+            counter('retries_total', "JSON-RPC requests sent again", 'retries')
+            counter('request_bytes_total', "Bytes of HTTP request bodies", 'request_bytes')
+            counter('response_bytes_total', "Bytes of HTTP response bodies", 'response_bytes')
+            counter('request_saved_bytes_total', "Bytes saved by compression of HTTP request bodies",
+                    'request_saved_bytes')
+            counter('response_saved_bytes_total', "Bytes saved by compression of HTTP response bodies",
+                    'response_saved_bytes')
+
+            lines.append("# HELP {}_latency_seconds Latency of HTTP requests".format(prefix))
+            lines.append("# TYPE {}_latency_seconds histogram".format(prefix))
+            for method in sorted(self.methods):
+                histogram('latency_seconds', self.methods[method].latency, 'method="{}"'.format(method))
+
+            lines.append("# HELP {}_batch_size JSON-RPC requests per batch request".format(prefix))
+            lines.append("# TYPE {}_batch_size histogram".format(prefix))
+            histogram('batch_size', self.batch_size)
+        return '\n'.join(lines) + '\n'
+
+
+# phases of a request timed by PhaseProfiler, time of helpers outside of them is 'extract'
+PHASES = ('serialize', 'network', 'decode', 'log')
+
+
+class PhaseProfiler():
+    """Time the phases of every JSON-RPC call and aggregate them per method and per high-level helper.
+
+    Phases of a request are 'serialize' (JSON encoding and compression), 'network' (HTTP request until the response is
+    received), 'decode' (JSON decoding) and 'log' (``pformat`` of debug logging). The time a helper like
+    ``get_general()`` spends outside of these phases is 'extract' - building params and processing
+    responses in Python. Helpers called by helpers are counted in both.
+
+    Concurrent batch chunks of ``send_batch_chunked()`` are counted per method as usual, for the calling
+    helper the whole wait for them is 'network'.
+
+    Example:
+        ``prof = api.enable_profiler(memory=True)``
+        ``api.find_host_ip_serial('host01', '10.0.0.1')``
+        ``print(prof.report())``
+
+    Args:
+        memory: ``bool``: Record the allocation peak of every outermost helper call with tracemalloc.
+            Slows down all Python code. Before Python 3.9 the peak is the peak since profiling started.
+
+    Attributes:
+        methods: ``dict``: method ('batch' for batch requests) => dict with 'calls' and seconds per phase
+        helpers: ``dict``: helper => dict with 'calls', 'total', seconds per phase, 'extract' and 'peak_bytes'
+        HELPER_PREFIXES: ``tuple``: Name prefixes of the methods ``attach()`` wraps by default.
+    """
+
+    HELPER_PREFIXES = ('get_', 'find_', 'set_', 'create_', 'update_', 'remove_', 'delete_', 'purge_',
+                       'archive_', 'recycle_', 'connect_', 'copy_', 'reconcile_', 'apply_', 'extract_')
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._attached = None           # (api, wrapped names)
+        self._tracing = False           # tracemalloc started by us
+        self.reset()
+
+    def reset(self):
+        """Remove all recorded values"""
+        with self._lock:
+            self.methods = {}
+            self.helpers = {}
+
+    def _frames(self):
+        """Phase sums of the active helper calls of the current thread, outermost first"""
+        frames = getattr(self._local, 'frames', None)
+        if frames is None:
+            frames = self._local.frames = []
+        return frames
+
+    def record(self, method, phases, calls=1):
+        """Add phase durations of method
+
+            Args:
+                method: ``str``: JSON-RPC method or 'batch'
+                phases: ``dict``: phase => seconds
+                calls: ``int``: Number of calls to count
+        """
+        with self._lock:
+            stats = self.methods.get(method)
+            if stats is None:
+                stats = self.methods[method] = dict.fromkeys(('calls',) + PHASES, 0)
+            stats['calls'] += calls
+            for phase, seconds in phases.items():
+                stats[phase] += seconds
+        self.record_wait(phases)
+
+    def record_wait(self, phases):
+        """Add phase durations to the active helper calls of the current thread only"""
+        for frame in self._frames():
+            for phase, seconds in phases.items():
+                frame[phase] += seconds
+
+    def wrap(self, name, func):
+        """Function calling func and recording it as helper name"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            frames = self._frames()
+            frame = dict.fromkeys(PHASES, 0.0)
+            outermost = self.memory and not frames
+            if outermost:
+                if hasattr(tracemalloc, 'reset_peak'):
+                    tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+            frames.append(frame)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                total = time.perf_counter() - start
+                frames.pop()
+                peak = tracemalloc.get_traced_memory()[1] - base if outermost else None
+                self._record_helper(name, total, frame, peak)
+        return wrapper
+
+    def _record_helper(self, name, total, frame, peak):
+        with self._lock:
+            stats = self.helpers.get(name)
+            if stats is None:
+                stats = self.helpers[name] = dict.fromkeys(('calls', 'total') + PHASES + ('extract',), 0)
+                stats['peak_bytes'] = None
+            stats['calls'] += 1
+            stats['total'] += total
+            for phase in PHASES:
+                stats[phase] += frame[phase]
+            stats['extract'] += max(0.0, total - sum(frame.values()))
+            if peak is not None:
+                stats['peak_bytes'] = max(peak, stats['peak_bytes'] or 0)
+
+    def attach(self, api, helpers=None):
+        """Record calls of the helpers of api, the methods are replaced by wrappers on the instance
+
+            Args:
+                api: ``IdoitAPI``
+                helpers: ``list``: Method names, default all methods starting with ``HELPER_PREFIXES``
+        """
+        self.detach()
+        if helpers is None:
+            helpers = [n for n in dir(type(api))
+                       if n.startswith(self.HELPER_PREFIXES) and callable(getattr(type(api), n))]
+        for name in helpers:
+            setattr(api, name, self.wrap(name, getattr(api, name)))
+        self._attached = (api, helpers)
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+    def detach(self):
+        """Restore the helpers replaced by ``attach()`` and stop tracemalloc if it was started by it"""
+        if self._attached is not None:
+            api, helpers = self._attached
+            for name in helpers:
+                api.__dict__.pop(name, None)
+            self._attached = None
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def snapshot(self):
+        """Copy of the recorded values: dict with keys 'methods' and 'helpers'"""
+        with self._lock:
+            return {
+                'methods': {m: dict(s) for m, s in self.methods.items()},
+                'helpers': {h: dict(s) for h, s in self.helpers.items()},
+            }
+
+    def report(self):
+        """Breakdown of the recorded time as text table, slowest first
+
+            Returns:
+                ``str``
+        """
+        snap = self.snapshot()
+        lines = []
+
+        def row(name, calls, total, stats, extra):
+            pct = ["{:5.1f}%".format(100.0 * stats[p] / total if total else 0.0) for p in PHASES + extra]
+            return "{:40s} {:7d} {:10.2f} {}".format(name, calls, total * 1000, ' '.join("{:>9s}".format(p) for p in pct))
+
+        header = "{:40s} {:>7s} {:>10s} {}"
+        lines.append(header.format('method', 'calls', 'total ms', ' '.join("{:>9s}".format(p) for p in PHASES)))
+        for method, stats in sorted(snap['methods'].items(), key=lambda i: -sum(i[1][p] for p in PHASES)):
+            lines.append(row(method, stats['calls'], sum(stats[p] for p in PHASES), stats, ()))
+
+        if snap['helpers']:
+            lines.append('')
+            lines.append(header.format('helper', 'calls', 'total ms',
+                                       ' '.join("{:>9s}".format(p) for p in PHASES + ('extract',))) + ' peak KiB')
+            for helper, stats in sorted(snap['helpers'].items(), key=lambda i: -i[1]['total']):
+                peak = stats['peak_bytes']
+                lines.append(row(helper, stats['calls'], stats['total'], stats, ('extract',)) +
+                             " {:>8s}".format("{:.0f}".format(peak / 1024.0) if peak is not None else '-'))
+        return '\n'.join(lines) + '\n'
+
+
+class DebugRing():
+    """Bounded in-memory buffer of the last request/response pairs, written to a file when a call fails.
+
+    Captures the serialized request body and the raw response body as they are sent and received,
+    truncated to max_bytes - nothing is formatted until ``dump()``. Failed requests are always captured,
+    the others with probability sample_rate. The apikey is replaced by '***' in requests before they are
+    truncated, the 'session-id' of ``idoit.login`` responses is replaced too.
+
+    Args:
+        size: ``int``: Number of request/response pairs to keep
+        sample_rate: ``float``: Probability that a successful request is captured
+        max_bytes: ``int``: Keep at most this many bytes of every request and response body
+        path: ``str``: File to dump to, formatted with ``time`` (milliseconds since epoch) and ``pid``
+        max_dumps: ``int``: Stop dumping after this many files, ``None`` for no limit
+        apikey: ``str``: Replaced by '***' in request bodies
+
+    Attributes:
+        dumps: ``list``: Paths of the files written
+    """
+
+    def __init__(self, size=100, sample_rate=1.0, max_bytes=4096, path='idoit-debug-{time}-{pid}.json',
+                 max_dumps=10, apikey=None):
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.path = path
+        self.max_dumps = max_dumps
+        self.dumps = []
+        self._secret = apikey.encode('utf-8') if apikey else None
+        self._ring = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def capture(self, method, body, status_code, content, seconds, failed=False, error=None):
+        """Add a request/response pair
+
+            Args:
+                method: ``str``: JSON-RPC method or 'batch'
+                body: ``bytes``: Request body
+                status_code: ``int``: HTTP status code, None on exceptions
+                content: ``bytes``: Response body
+                seconds: ``float``: Latency
+                failed: ``bool``: Capture regardless of sample_rate
+                error: ``str``: Exception raised by the transport
+        """
+        if not failed and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        req = body
+        if self._secret:
+            # mask before truncating, a key cut in two would not be found anymore
+            req = body[:self.max_bytes + len(self._secret)].replace(self._secret, b'***')
+        if method == 'idoit.login' and content:
+            content = self._redact_session(content)
+        entry = (time.time(), method, status_code, seconds, len(body), req[:self.max_bytes],
+                 len(content), content[:self.max_bytes], error)
+        with self._lock:
+            self._ring.append(entry)
+
+    @staticmethod
+    def _redact_session(content):
+        """Response of idoit.login with 'session-id' replaced, the session ID is a credential"""
+        try:
+            res = json.loads(content)
+        except ValueError:
+            return b'(idoit.login response not captured)'
+        if isinstance(res, dict) and isinstance(res.get('result'), dict) and 'session-id' in res['result']:
+            res['result']['session-id'] = '***'
+        return json.dumps(res).encode('utf-8')
+
+    def entries(self):
+        """Captured pairs as list of dicts, oldest first"""
+        with self._lock:
+            ring = list(self._ring)
+        res = []
+        for t, method, status, seconds, req_len, req, res_len, content, error in ring:
+            req_truncated = req_len > len(req)
+            res.append({
+                'time': t,
+                'method': method,
+                'status_code': status,
+                'seconds': seconds,
+                'request_bytes': req_len,
+                'request': req.decode('utf-8', 'replace'),
+                'request_truncated': req_truncated,
+                'response_bytes': res_len,
+                'response': content.decode('utf-8', 'replace'),
+                'response_truncated': res_len > len(content),
+                'error': error,
+            })
+        return res
+
+    def dump(self, reason):
+        """Write the captured pairs to a new file
+
+            Args:
+                reason: ``str``: Error message stored in the file
+            Returns:
+                ``str`` path of the file or None if max_dumps files were written
+        """
+        if self.max_dumps is not None and len(self.dumps) >= self.max_dumps:
+            return None
+        path = self.path.format(time=int(time.time() * 1000), pid=os.getpid())
+        with open(path, 'w') as f:
+            json.dump({'reason': reason, 'entries': self.entries()}, f, indent=2)
+        self.dumps.append(path)
+        return path
+
+    def clear(self):
+        with self._lock:
+            self._ring.clear()
+
+    def __len__(self):
+        return len(self._ring)
@@ -0,0 +1,149 @@
+"""Local SQLite mirror of i-doit objects and categories for fast repeated reads"""
+import json
+import logging
+import sqlite3
+import threading
+
+
+class CMDBMirror():
+    """Mirror objects of some types and a set of their categories into a SQLite database.
+
+    The first ``refresh()`` loads all objects, later calls only fetch categories of objects whose
+    'updated' timestamp changed and remove objects that are gone. Set it as ``IdoitAPI.mirror`` and
+    ``get_category_from_object()`` - and therefore ``get_general()``, ``get_location()``,
+    ``get_ipv4_address()`` etc. - reads mirrored categories from disk instead of i-doit.
+    Writes are not applied to the mirror, call ``refresh()`` to pick them up.
+
+    Example:
+        ``mirror = CMDBMirror(api, 'cmdb.sqlite', ['C__OBJTYPE__SWITCH'], ['C__CATG__GLOBAL', 'C__CATG__IP'])``
+        ``mirror.refresh()``
+        ``api.mirror = mirror``
+
+    Args:
+        api: ``IdoitAPI``: API instance to read from
+        path: ``str``: Path of SQLite database, ':memory:' for a mirror in RAM
+        obj_types: ``list``: Object type constants to mirror
+        categories: ``list``: Category constants to mirror, at least one
+        page_size: ``int``: Objects per ``cmdb.objects.read`` request
+
+    Raise:
+        ValueError: categories is empty.
+    """
+
+    def __init__(self, api, path, obj_types, categories, page_size=1000):
+        self.log = logging.getLogger(__name__)
+        self.api = api
+        self.path = path
+        self.obj_types = list(obj_types)
+        self.categories = list(categories)
+        if not self.categories:
+            raise ValueError("CMDBMirror needs at least one category")
+        self.page_size = page_size
+
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS objects (
+                id INTEGER PRIMARY KEY,
+                type TEXT,
+                title TEXT,
+                updated TEXT,
+                data TEXT
+            );
+            CREATE INDEX IF NOT EXISTS objects_type ON objects (type);
+            CREATE TABLE IF NOT EXISTS categories (
+                obj_id INTEGER,
+                category TEXT,
+                entries TEXT,
+                PRIMARY KEY (obj_id, category)
+            );
+        """)
+
+    def close(self):
+        """Close the SQLite database"""
+        self.db.close()
+
+    def refresh(self, full=False):
+        """Update mirror from i-doit, only changed objects are fetched unless full is True\n
+            - Uses: ``cmdb.objects.read``, ``cmdb.category.read``
+
+            Args:
+                full: ``bool``: Fetch categories of all objects.
+            Returns:
+                Dict with number of 'new', 'changed' and 'removed' objects.
+        """
+        headers = {}
+        types = {}              # type constant we filtered for, 'type' of objects is the numeric ID
+        for t in self.obj_types:
+            for o in self.api.get_all_objects({'type': t, 'status': 2}, page_size=self.page_size):
+                headers[int(o['id'])] = o
+                types[int(o['id'])] = t
+
+        with self._lock:
+            marks = ','.join('?' * len(self.obj_types))
+            stored = dict(self.db.execute("SELECT id, updated FROM objects WHERE type IN ({})".format(marks),
+                                            self.obj_types).fetchall())
+        fetch = [i for i, o in headers.items() if full or stored.get(i) != o.get('updated')]
+        removed = [i for i in stored if i not in headers]
+
+        cats = self.api.get_categories_from_objects(fetch, self.categories) if fetch else {}
+
+        with self._lock, self.db:
+            for i in fetch:
+                o = headers[i]
+                updated = o.get('updated')
+                if any(entries is None for entries in cats[i].values()):
+                    updated = None          # read failed, fetch again on next refresh
+                self.db.execute("INSERT OR REPLACE INTO objects (id, type, title, updated, data) VALUES (?,?,?,?,?)",
+                                (i, types[i], o.get('title'), updated, json.dumps(o)))
+                self.db.executemany("INSERT OR REPLACE INTO categories (obj_id, category, entries) VALUES (?,?,?)",
+                                    [(i, c, json.dumps(e)) for c, e in cats[i].items() if e is not None])
+            for i in removed:
+                self.db.execute("DELETE FROM objects WHERE id = ?", (i,))
+                self.db.execute("DELETE FROM categories WHERE obj_id = ?", (i,))
+
+        ret = {'new': len([i for i in fetch if i not in stored]),
+                'changed': len([i for i in fetch if i in stored]),
+                'removed': len(removed)}
+        self.log.info("CMDBMirror refresh: {}".format(ret))
+        return ret
+
+    def read_category(self, obj_id, category):
+        """Read mirrored category of an object
+
+            Args:
+                obj_id: ``int``: Object ID of i-doit object.
+                category: ``str``: **Category constant**.
+            Returns:
+                List of category entries like 'result' of ``cmdb.category.read`` or None if not mirrored.
+        """
+        if category not in self.categories:
+            return None
+        with self._lock:
+            row = self.db.execute("SELECT entries FROM categories WHERE obj_id = ? AND category = ?",
+                                    (int(obj_id), category)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def get_object(self, obj_id):
+        """Read mirrored object like ``cmdb.objects.read`` returns it or None if not mirrored"""
+        with self._lock:
+            row = self.db.execute("SELECT data FROM objects WHERE id = ?", (int(obj_id),)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def get_objects(self, obj_type=None, title=None):
+        """List of mirrored objects, optionally filtered by object type constant and / or title"""
+        sql = "SELECT data FROM objects WHERE 1=1"
+        args = []
+        if obj_type:
+            sql += " AND type = ?"
+            args.append(obj_type)
+        if title:
+            sql += " AND title = ?"
+            args.append(title)
+        with self._lock:
+            rows = self.db.execute(sql, args).fetchall()
+        return [json.loads(r[0]) for r in rows]
@@ -0,0 +1,264 @@
+"""IPv4 helpers working on local data - address to object index and free address allocation"""
+import bisect
+import ipaddress
+import logging
+import threading
+from array import array
+
+
+class IPv4Index():
+    """Compact sorted index IPv4 address => object ID for reverse lookups without i-doit.
+
+    Addresses are kept as integers in two parallel sorted arrays, a lookup is a binary search and a
+    subnet query is a range of the arrays. An address assigned to more than one object is stored once
+    per object.
+
+    Example:
+        ``index = IPv4Index.from_api(api, switch_ids)``
+        ``index.lookup('10.20.0.4')``
+        ``index.in_network('10.20.0.0/16')``
+    """
+
+    def __init__(self):
+        # 'I' is 4 bytes per entry, 'L' would be 8 bytes on 64 bit Linux
+        self._ips = array('I')         # sorted IPv4 addresses as int
+        self._objs = array('I')        # object ID of address at same position
+
+    def __len__(self):
+        return len(self._ips)
+
+    @classmethod
+    def from_api(cls, api, obj_ids):
+        """Build index from all addresses of category 'C__CATG__IP' of the objects\n
+            - Uses: ``cmdb.category.read``
+
+            Args:
+                api: ``IdoitAPI``: API instance to read from
+                obj_ids: ``list``: Object IDs of i-doit objects
+            Returns:
+                New IPv4Index
+        """
+        index = cls()
+        pairs = []
+        for obj_id, cats in api.get_categories_from_objects(obj_ids, 'C__CATG__IP').items():
+            for ip in cls.extract_addresses(cats['C__CATG__IP'] or []):
+                pairs.append((ip, obj_id))
+        index.build(pairs)
+        return index
+
+    @staticmethod
+    def extract_addresses(entries):
+        """IPv4 addresses of 'C__CATG__IP' entries
+
+            Args:
+                entries: ``list``: 'result' of ``cmdb.category.read``
+            Returns:
+                List of address strings, entries without IPv4 address (e.g. IPv6) are skipped.
+        """
+        ret = []
+        for e in entries:
+            for k in ('hostaddress', 'ipv4_address'):
+                if isinstance(e.get(k), dict) and e[k].get('ref_title'):
+                    try:
+                        ipaddress.IPv4Address(e[k]['ref_title'].strip())
+                    except ValueError:
+                        break
+                    ret.append(e[k]['ref_title'])
+                    break
+        return ret
+
+    def build(self, pairs):
+        """Replace index content
+
+            Args:
+                pairs: ``iterable``: Tuples (ip, obj_id), ip as string or int
+        """
+        items = sorted({(self._to_int(ip), int(obj_id)) for ip, obj_id in pairs})
+        self._ips = array('I', [i for i, o in items])
+        self._objs = array('I', [o for i, o in items])
+
+    def add(self, ip, obj_id):
+        """Add address of an object, O(n) - use ``build()`` for many addresses"""
+        key = (self._to_int(ip), int(obj_id))
+        lo = bisect.bisect_left(self._ips, key[0])
+        hi = bisect.bisect_right(self._ips, key[0])
+        if key[1] in self._objs[lo:hi]:
+            return
+        self._ips.insert(hi, key[0])
+        self._objs.insert(hi, key[1])
+
+    def remove(self, ip, obj_id=None):
+        """Remove address, only for obj_id if given"""
+        ip = self._to_int(ip)
+        lo = bisect.bisect_left(self._ips, ip)
+        hi = bisect.bisect_right(self._ips, ip)
+        for pos in reversed(range(lo, hi)):
+            if obj_id is None or self._objs[pos] == int(obj_id):
+                del self._ips[pos]
+                del self._objs[pos]
+
+    def lookup(self, ip):
+        """Object IDs owning an IPv4 address
+
+            Args:
+                ip: ``str``: IPv4 address, e.g. '10.20.0.4'
+            Returns:
+                List of object IDs, empty if address is unknown.
+        """
+        ip = self._to_int(ip)
+        lo = bisect.bisect_left(self._ips, ip)
+        hi = bisect.bisect_right(self._ips, ip)
+        return list(self._objs[lo:hi])
+
+    def in_network(self, network):
+        """All known addresses in a subnet
+
+            Args:
+                network: ``str``: Subnet in CIDR notation, e.g. '10.20.0.0/16'
+            Returns:
+                List of tuples (ip, obj_id) sorted by address.
+        """
+        net = ipaddress.IPv4Network(network, strict=False)
+        lo = bisect.bisect_left(self._ips, int(net.network_address))
+        hi = bisect.bisect_right(self._ips, int(net.broadcast_address))
+        return [(str(ipaddress.IPv4Address(self._ips[i])), self._objs[i]) for i in range(lo, hi)]
+
+    @staticmethod
+    def _to_int(ip):
+        if isinstance(ip, int):
+            return ip
+        return int(ipaddress.IPv4Address(ip.strip()))
+
+
+class IPv4Allocator():
+    """Find and reserve free addresses of a layer-3 net ('C__OBJTYPE__LAYER3_NET').
+
+    The used addresses of the net are loaded with one batch request into a bitmap (a Python ``int``,
+    bit n = n-th address of the range), so searching free addresses works on machine words instead of
+    single addresses. ``allocate()`` reserves the addresses it returns under a lock, concurrent threads
+    sharing one allocator never get the same address. Reservations are kept on ``load()``.
+
+    Example:
+        ``alloc = IPv4Allocator(api, net_id)``
+        ``for ip in alloc.allocate(4):``
+            ``api.set_ipv4_address(obj_id, ip)``
+
+    Args:
+        api: ``IdoitAPI``: API instance to read from
+        net_id: ``int``: Object ID of the layer-3 net
+    """
+
+    def __init__(self, api, net_id):
+        self.log = logging.getLogger(__name__)
+        self.api = api
+        self.net_id = int(net_id)
+
+        self._lock = threading.Lock()
+        self._reserved = 0          # bitmap of addresses reserved by allocate()
+        self._used = 0              # bitmap of addresses used in i-doit or reserved
+        self.first = None           # first address of range as int
+        self.size = 0               # number of addresses in range
+        self.load()
+
+    def load(self):
+        """(Re)load range and used addresses of the net from i-doit\n
+            - Uses: ``cmdb.category.read`` 'C__CATS__NET' and 'C__CATS__NET_IP_ADDRESSES'
+        """
+        cats = self.api.get_categories_from_objects([self.net_id], ['C__CATS__NET', 'C__CATS__NET_IP_ADDRESSES'])
+        cats = cats[self.net_id]
+        if not cats['C__CATS__NET'] or cats['C__CATS__NET_IP_ADDRESSES'] is None:
+            raise ValueError("Object {} is no layer-3 net or reading it failed".format(self.net_id))
+        net = cats['C__CATS__NET'][0]
+
+        if net.get('range_from') and net.get('range_to'):
+            first = int(ipaddress.IPv4Address(net['range_from']))
+            last = int(ipaddress.IPv4Address(net['range_to']))
+        else:
+            n = ipaddress.IPv4Network("{}/{}".format(net['address'], net['cidr_suffix']), strict=False)
+            first = int(n.network_address) + 1
+            last = int(n.broadcast_address) - 1
+
+        used = 0
+        for e in cats['C__CATS__NET_IP_ADDRESSES']:
+            ip = e.get('title')
+            if isinstance(ip, dict):
+                ip = ip.get('ref_title')
+            try:
+                pos = int(ipaddress.IPv4Address(ip)) - first
+            except ValueError:
+                continue
+            if 0 <= pos <= last - first:
+                used |= 1 << pos
+
+        with self._lock:
+            if first != self.first:
+                self._reserved = 0      # range changed, old reservations are meaningless
+            self.first = first
+            self.size = last - first + 1
+            self._used = used | self._reserved
+        self.log.info("IPv4Allocator net {}: {} of {} addresses free".format(self.net_id, self.free_count(), self.size))
+
+    def free_count(self):
+        """Number of free addresses"""
+        return self.size - bin(self._used).count('1')
+
+    def is_free(self, ip):
+        """True if ip is part of the range and neither used nor reserved"""
+        pos = int(ipaddress.IPv4Address(ip)) - self.first
+        return 0 <= pos < self.size and not (self._used >> pos) & 1
+
+    def allocate(self, count=1, contiguous=False):
+        """Reserve free addresses
+
+            Args:
+                count: ``int``: Number of addresses
+                contiguous: ``bool``: Addresses must be a continuous block
+            Returns:
+                List of reserved addresses (``str``), lowest first.
+            Raise:
+                ValueError: Not enough free addresses.
+        """
+        with self._lock:
+            free = ~self._used & ((1 << self.size) - 1)
+            if contiguous:
+                # bit n of run is set if bits n..n+count-1 of free are set
+                run = free
+                length = 1
+                while length < count and run:
+                    shift = min(length, count - length)
+                    run &= run >> shift
+                    length += shift
+                if not run:
+                    raise ValueError("No {} contiguous free addresses in net {}".format(count, self.net_id))
+                start = (run & -run).bit_length() - 1
+                bits = ((1 << count) - 1) << start
+                positions = list(range(start, start + count))
+            else:
+                bits = 0
+                positions = []
+                while len(positions) < count:
+                    if not free:
+                        raise ValueError("No {} free addresses in net {}".format(count, self.net_id))
+                    low = free & -free
+                    free ^= low
+                    bits |= low
+                    positions.append(low.bit_length() - 1)
+            self._used |= bits
+            self._reserved |= bits
+        return [str(ipaddress.IPv4Address(self.first + p)) for p in positions]
+
+    def release(self, ips):
+        """Give reserved addresses back, e.g. when provisioning failed
+
+            Args:
+                ips: ``list``: Addresses returned by ``allocate()``
+        """
+        bits = 0
+        for ip in ips:
+            pos = int(ipaddress.IPv4Address(ip)) - self.first
+            if 0 <= pos < self.size:
+                bits |= 1 << pos
+        with self._lock:
+            bits &= self._reserved
+            self._reserved &= ~bits
+            self._used &= ~bits
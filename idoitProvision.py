@@ -0,0 +1,186 @@
+"""Template driven bulk provisioning of i-doit objects"""
+import logging
+
+
+class DeviceTemplate():
+    """Description of a device type that can be created many times with ``Provisioner``.
+
+    Strings in title, description, categories and ports are format strings, they are formatted with
+    the parameters of each instance, e.g. title "Panel {room}-{nr:02d}" with {'room': 'A', 'nr': 3}.
+
+    Example:
+        ``tpl = DeviceTemplate.patch_panel(24, rackunits=1, title="Panel {name}")``
+        ``Provisioner(api).provision(tpl, [{'name': 'A01'}, {'name': 'A02'}])``
+
+    Args:
+        obj_type: ``str``: Object type constant
+        title: ``str``: Title of object, format string
+        status: ``int``: CMDB status ID, see ``IdoitAPI.create_object_by_type()``
+        categories: ``dict``: {category: list of entries} created with the object
+        ports: ``list``: Entries of 'C__CATG__CONNECTOR', e.g. {'title': 'P01', 'type': 1, 'connection_type': ...}
+        siblings: ``list``: Tuples (index_a, index_b) of ports to connect as siblings (panel in/out)
+        formfactor: ``str``: Form factor constant, e.g. 'C__FORMFACTOR_TYPE__19INCH'
+        rackunits: ``int``: Height in rack units
+        description: ``str``: Description of object, format string
+    """
+
+    def __init__(self, obj_type, title, status=6, categories=None, ports=None, siblings=None,
+                    formfactor=None, rackunits=None, description=None):
+        self.obj_type = obj_type
+        self.title = title
+        self.status = status
+        self.categories = categories or {}
+        self.ports = ports or []
+        self.siblings = siblings or []
+        self.formfactor = formfactor
+        self.rackunits = rackunits
+        self.description = description
+
+    @classmethod
+    def patch_panel(cls, port_count, prefix_in="P", prefix_out="Pout ", connection_type='C__CONNECTION_TYPE__RJ45',
+                    rackunits=1, title="Panel {name}", status=6):
+        """Template of a 19' patch panel with port_count input and output ports connected as siblings
+
+            Args:
+                port_count: ``int``: Number of ports - in and out each
+                prefix_in: ``str``: Prefix of input port
+                prefix_out: ``str``: Prefix of output port
+                connection_type: ``str``: Connection type constant of ports
+                rackunits: ``int``: Height in rack units
+                title: ``str``: Title of panel, format string
+                status: ``int``: CMDB status ID
+            Returns:
+                New DeviceTemplate
+        """
+        ports = []
+        siblings = []
+        for i in range(port_count):
+            ports.append({'connection_type': connection_type, 'title': "{}{:02d}".format(prefix_in, i+1), 'type': 1})
+            ports.append({'connection_type': connection_type, 'title': "{}{:02d}".format(prefix_out, i+1), 'type': 2})
+            siblings.append((2*i, 2*i+1))
+        return cls('C__OBJTYPE__PATCH_PANEL', title, status=status, ports=ports, siblings=siblings,
+                    formfactor='C__FORMFACTOR_TYPE__19INCH', rackunits=rackunits)
+
+    def render(self, params):
+        """Parameters of ``cmdb.object.create`` for one instance
+
+            Args:
+                params: ``dict``: Values for the format strings
+            Returns:
+                Dict with keys 'type', 'title', 'cmdb_status', 'categories' and maybe 'description'
+        """
+        categories = {c: self._format(e, params) for c, e in self.categories.items()}
+        if self.ports:
+            categories['C__CATG__CONNECTOR'] = self._format(self.ports, params)
+        if self.formfactor or self.rackunits:
+            ff = {}
+            if self.formfactor:
+                ff['formfactor'] = self.formfactor
+            if self.rackunits:
+                ff['rackunits'] = self.rackunits
+            categories['C__CATG__FORMFACTOR'] = [ff]
+
+        p = {
+            'type': self.obj_type,
+            'title': self._format(self.title, params),
+            'cmdb_status': self.status,
+        }
+        if self.description:
+            p['description'] = self._format(self.description, params)
+        if categories:
+            p['categories'] = categories
+        return p
+
+    def _format(self, value, params):
+        if isinstance(value, str):
+            return value.format(**params)
+        if isinstance(value, dict):
+            return {k: self._format(v, params) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._format(v, params) for v in value]
+        return value
+
+
+class Provisioner():
+    """Create many objects from a ``DeviceTemplate`` with batch requests.
+
+    First pass creates all objects with their categories in chunked ``cmdb.object.create`` batch
+    requests, the second pass connects port siblings of all objects in chunked ``cmdb.category.save``
+    batch requests. The number of round trips grows with instances / chunk size only.
+
+    Args:
+        api: ``IdoitAPI``: API instance to write with
+        chunk_size: ``int``: Requests per batch request, default ``IdoitAPI.batch_chunk_size``
+        max_workers: ``int``: Batch requests send concurrently, default ``IdoitAPI.batch_max_workers``
+    """
+
+    def __init__(self, api, chunk_size=None, max_workers=None):
+        self.log = logging.getLogger(__name__)
+        self.api = api
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+
+    def _send(self, data_list):
+        return self.api.send_batch_chunked(data_list, chunk_size=self.chunk_size, max_workers=self.max_workers)
+
+    def provision(self, template, instances):
+        """Create one object per instance
+
+            Args:
+                template: ``DeviceTemplate``: Template of the objects
+                instances: ``iterable``: Dicts with parameters of each object
+            Returns:
+                List of dicts per instance with keys 'params', 'id' (new object ID or None), 'success' (``bool``),
+                'error' and 'connectors' (entry IDs of ports in order of template ports)
+        """
+        instances = list(instances)
+        report = [{'params': p, 'id': None, 'success': False, 'error': None, 'connectors': []} for p in instances]
+
+        # first pass - create objects
+        res = self._send([self.api.build_rpc('cmdb.object.create', template.render(p)) for p in instances])
+        for rep, r in zip(report, res):
+            if r is None or 'error' in r:
+                rep['error'] = r['error']['message'] if r else "No response"
+                continue
+            rep['id'] = int(r['result']['id'])
+            rep['connectors'] = list((r['result'].get('categories') or {}).get('C__CATG__CONNECTOR') or [])
+
+        if template.siblings:
+            self._resolve_connectors(template, report)
+            saves = []
+            for rep in report:
+                if rep['id'] is None:
+                    continue
+                if len(rep['connectors']) != len(template.ports):
+                    rep['error'] = "Ports of object {} not found".format(rep['id'])
+                    continue
+                for a, b in template.siblings:
+                    for x, y in ((a, b), (b, a)):
+                        saves.append((rep, self.api.build_rpc('cmdb.category.save', {
+                                                'object': rep['id'], 'category': 'C__CATG__CONNECTOR',
+                                                'entry': int(rep['connectors'][x]),
+                                                'data': {'connector_sibling': int(rep['connectors'][y])}})))
+            # second pass - connect siblings
+            for (rep, data), r in zip(saves, self._send([d for rep, d in saves])):
+                if (r is None or 'error' in r) and rep['error'] is None:
+                    rep['error'] = r['error']['message'] if r else "No response"
+
+        for rep in report:
+            rep['success'] = rep['id'] is not None and rep['error'] is None
+        self.log.info("Provisioner: {} of {} objects created".format(
+                        len([r for r in report if r['success']]), len(report)))
+        return report
+
+    def _resolve_connectors(self, template, report):
+        """Read port entry IDs of created objects whose create response didn't return them"""
+        todo = [rep for rep in report if rep['id'] is not None and len(rep['connectors']) != len(template.ports)]
+        if not todo:
+            return
+        cats = self.api.get_categories_from_objects([rep['id'] for rep in todo], 'C__CATG__CONNECTOR')
+        for rep in todo:
+            titles = {}
+            for e in cats[rep['id']]['C__CATG__CONNECTOR'] or []:
+                titles.setdefault(e['title'], int(e['id']))
+            ids = [titles.get(template._format(p['title'], rep['params'])) for p in template.ports]
+            if None not in ids:
+                rep['connectors'] = ids
@@ -0,0 +1,320 @@
+"""In-memory views of i-doit topology - location tree and connector graph"""
+import logging
+
+
+class LocationTree():
+    """Location hierarchy of all objects built from 'C__CATG__LOCATION' with one paged read.
+
+    Parent and children indexes and the location path of every object are computed once, so
+    queries like "all objects under this building" or the path of thousands of objects run locally.
+    ``move()`` updates the tree and sends all changes as one chunked batch request.
+
+    Example:
+        ``tree = LocationTree.from_api(api)``
+        ``tree.descendants(building_id)``
+        ``tree.location_path(obj_id)``
+
+    Args:
+        sep: ``str``: Separator of titles in location paths
+    """
+
+    def __init__(self, sep=' > '):
+        self.log = logging.getLogger(__name__)
+        self.sep = sep
+        self.parents = {}           # obj_id => location (parent) obj_id
+        self.children = {}          # obj_id => list of obj_ids located in it
+        self.titles = {}            # obj_id => title
+        self._paths = {}            # obj_id => location path, filled by _build_paths()
+
+    @classmethod
+    def from_api(cls, api, filter_dict=None, page_size=1000, sep=' > '):
+        """Build tree from i-doit\n
+            - Uses: ``cmdb.objects.read`` with category 'C__CATG__LOCATION'
+
+            Args:
+                api: ``IdoitAPI``: API instance to read from
+                filter_dict: ``dict``: Filter of objects, default all normal objects {'status': 2}
+                page_size: ``int``: Objects per request
+                sep: ``str``: Separator of titles in location paths
+            Returns:
+                New LocationTree
+        """
+        tree = cls(sep=sep)
+        objs = api.get_all_objects(filter_dict or {'status': 2}, categories=['C__CATG__LOCATION'],
+                                    page_size=page_size)
+        tree.build(objs)
+        return tree
+
+    def build(self, objs):
+        """Replace tree content
+
+            Args:
+                objs: ``list``: Objects as returned by ``cmdb.objects.read`` with category 'C__CATG__LOCATION'
+        """
+        self.parents = {}
+        self.children = {}
+        self.titles = {}
+        for o in objs:
+            obj_id = int(o['id'])
+            self.titles[obj_id] = o.get('title')
+            locs = (o.get('categories') or {}).get('C__CATG__LOCATION') or []
+            parent = locs[0].get('parent') if locs else None
+            if parent:
+                p_id = int(parent['id'])
+                self.titles.setdefault(p_id, parent.get('title'))
+                self.parents[obj_id] = p_id
+                self.children.setdefault(p_id, []).append(obj_id)
+        self._build_paths()
+        self.log.info("LocationTree: {} objects, {} located".format(len(self.titles), len(self.parents)))
+
+    def _build_paths(self):
+        self._paths = {}
+        for obj_id in self.titles:
+            # walk up until an object with known path, then fill paths down again
+            chain = []
+            cur = obj_id
+            while cur not in self._paths and cur not in chain:
+                chain.append(cur)
+                cur = self.parents.get(cur)
+                if cur is None:
+                    break
+            base = self._join(self._paths[cur], cur) if cur in self._paths else ''
+            for c in reversed(chain):
+                self._paths[c] = base
+                base = self._join(base, c)
+
+    def _join(self, path, obj_id):
+        """Append title of obj_id to path"""
+        if not path:
+            return str(self.titles.get(obj_id))
+        return "{}{}{}".format(path, self.sep, self.titles.get(obj_id))
+
+    def parent(self, obj_id):
+        """Location object ID of an object or None"""
+        return self.parents.get(int(obj_id))
+
+    def ancestors(self, obj_id):
+        """Object IDs of all locations of an object, top level first"""
+        ret = []
+        cur = self.parents.get(int(obj_id))
+        while cur is not None and cur not in ret:
+            ret.append(cur)
+            cur = self.parents.get(cur)
+        return list(reversed(ret))
+
+    def descendants(self, obj_id):
+        """Object IDs of all objects located below an object, e.g. everything in a building"""
+        ret = []
+        seen = {int(obj_id)}
+        todo = list(self.children.get(int(obj_id), []))
+        while todo:
+            cur = todo.pop()
+            if cur in seen:
+                continue
+            seen.add(cur)
+            ret.append(cur)
+            todo.extend(self.children.get(cur, []))
+        return ret
+
+    def location_path(self, obj_id):
+        """Titles of all locations of an object joined by sep, '' if object has no location"""
+        return self._paths.get(int(obj_id), '')
+
+    def location_paths(self, obj_ids):
+        """Dict {obj_id: location_path} of many objects"""
+        return {int(o): self._paths.get(int(o), '') for o in obj_ids}
+
+    def location(self, obj_id):
+        """Location of an object like ``IdoitAPI.get_location()`` returns it
+
+            Returns:
+                Dict with keys 'title', 'id', 'location_path' or None
+        """
+        p_id = self.parents.get(int(obj_id))
+        if p_id is None:
+            return None
+        return {'title': self.titles.get(p_id), 'id': p_id, 'location_path': self.location_path(obj_id)}
+
+    def move(self, moves, api=None):
+        """Move objects to new locations, locally and - if api is given - in i-doit with one batched write
+
+            Args:
+                moves: ``dict``: {obj_id: new location obj_id}
+                api: ``IdoitAPI``: API instance to write with, None = update only the tree
+            Returns:
+                Dict {obj_id: json rpc response} of ``IdoitAPI.set_locations()`` or {}
+        """
+        for obj_id, p_id in moves.items():
+            obj_id, p_id = int(obj_id), int(p_id)
+            old = self.parents.get(obj_id)
+            if old is not None:
+                self.children[old].remove(obj_id)
+            self.parents[obj_id] = p_id
+            self.children.setdefault(p_id, []).append(obj_id)
+            self.titles.setdefault(obj_id, None)
+            self.titles.setdefault(p_id, None)
+        self._build_paths()
+        if api is None:
+            return {}
+        return api.set_locations(moves)
+
+
+class ConnectorGraph():
+    """Connectors ('C__CATG__CONNECTOR') of a set of objects as graph for local cable path tracing.
+
+    Connectors are indexed by entry ID and by (obj_id, title). Edges are cables ('assigned_connector')
+    and the internal link of patch panel ports ('connector_sibling'). Tracing a switch port through
+    patch panels to the endpoint runs locally, objects reached on the way that are not loaded yet are
+    read in one batch per hop if an api is given.
+
+    Example:
+        ``graph = ConnectorGraph.from_api(api, [switch_id, panel_a_id, panel_b_id])``
+        ``graph.patched_to(switch_id, 'Port 02')``
+        ``graph.trace(switch_id, 'Port 02')``
+    """
+
+    def __init__(self):
+        self.log = logging.getLogger(__name__)
+        self.connectors = {}        # entry ID => dict with keys 'id', 'obj_id', 'title', 'type', 'cable', 'sibling'
+        self.by_title = {}          # (obj_id, title) => entry ID
+        self.peer_objects = {}      # entry ID of connector not loaded => obj_id if known
+        self.loaded = set()         # obj_ids whose connectors are loaded
+
+    @classmethod
+    def from_api(cls, api, obj_ids):
+        """Build graph from connectors of objects\n
+            - Uses: ``cmdb.category.read`` 'C__CATG__CONNECTOR'
+
+            Args:
+                api: ``IdoitAPI``: API instance to read from
+                obj_ids: ``list``: Object IDs of i-doit objects
+            Returns:
+                New ConnectorGraph
+        """
+        graph = cls()
+        graph.load(api, obj_ids)
+        return graph
+
+    def load(self, api, obj_ids):
+        """Add connectors of objects with one chunked batch request, already loaded objects are skipped"""
+        obj_ids = [int(o) for o in obj_ids if int(o) not in self.loaded]
+        if not obj_ids:
+            return
+        for obj_id, cats in api.get_categories_from_objects(obj_ids, 'C__CATG__CONNECTOR').items():
+            if cats['C__CATG__CONNECTOR'] is None:
+                raise ValueError("Reading C__CATG__CONNECTOR of object {} failed".format(obj_id))
+            self.add_connectors(obj_id, cats['C__CATG__CONNECTOR'])
+
+    def add_connectors(self, obj_id, entries):
+        """Add connectors of an object
+
+            Args:
+                obj_id: ``int``: Object ID of i-doit object
+                entries: ``list``: 'result' of ``cmdb.category.read`` 'C__CATG__CONNECTOR'
+        """
+        obj_id = int(obj_id)
+        self.loaded.add(obj_id)
+        for e in entries:
+            con_id = int(e['id'])
+            con = self.connectors.setdefault(con_id, {'cable': None, 'sibling': None})
+            con.update({'id': con_id, 'obj_id': obj_id, 'title': e.get('title'), 'type': self._ref_title(e.get('type'))})
+            self.by_title[(obj_id, e.get('title'))] = con_id
+            self.peer_objects.pop(con_id, None)
+
+            peer_id, peer_obj = self._parse_ref(e.get('assigned_connector'))
+            if peer_id is not None:
+                con['cable'] = peer_id
+                peer = self.connectors.setdefault(peer_id, {'id': peer_id, 'obj_id': peer_obj, 'title': None,
+                                                            'type': None, 'cable': None, 'sibling': None})
+                peer['cable'] = con_id          # only one side might store the cable
+                if peer['obj_id'] not in self.loaded:
+                    self.peer_objects[peer_id] = peer_obj
+
+            sib_id, sib_obj = self._parse_ref(e.get('connector_sibling'))
+            if sib_id is not None:
+                con['sibling'] = sib_id
+                sib = self.connectors.setdefault(sib_id, {'id': sib_id, 'obj_id': obj_id, 'title': None,
+                                                            'type': None, 'cable': None, 'sibling': None})
+                sib['sibling'] = con_id
+
+    @staticmethod
+    def _ref_title(value):
+        if isinstance(value, dict):
+            return value.get('title')
+        return value
+
+    @staticmethod
+    def _parse_ref(value):
+        """Connector entry ID and object ID of a connector reference as read from i-doit
+
+            References are read as dict or list with one dict. The entry ID is taken from 'con_id' or
+            'ref_id' - then 'id' is the object ID - else 'id' is the entry ID.
+
+            Returns:
+                Tuple (entry ID or None, obj_id or None)
+        """
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if not value:
+            return (None, None)
+        if not isinstance(value, dict):
+            return (int(value), None)
+        for k in ('con_id', 'ref_id', 'connector_id'):
+            if value.get(k):
+                obj = value.get('id') or value.get('obj_id') or value.get('objID')
+                return (int(value[k]), int(obj) if obj else None)
+        if value.get('id'):
+            obj = value.get('obj_id') or value.get('objID')
+            return (int(value['id']), int(obj) if obj else None)
+        return (None, None)
+
+    def connector(self, obj_id, title):
+        """Connector dict of a port by object ID and port title or None"""
+        con_id = self.by_title.get((int(obj_id), title))
+        return self.connectors.get(con_id) if con_id is not None else None
+
+    def patched_to(self, obj_id, title):
+        """Connector at the other end of the cable plugged into a port or None"""
+        con = self.connector(obj_id, title)
+        if con is None or con['cable'] is None:
+            return None
+        return self.connectors.get(con['cable'])
+
+    def trace(self, obj_id, title, api=None, max_hops=64):
+        """Follow the cable path of a port - cable, sibling port of a panel, cable, ... - to the end point
+
+            Args:
+                obj_id: ``int``: Object ID of i-doit object
+                title: ``str``: Port title
+                api: ``IdoitAPI``: Load objects reached on the way that are not loaded yet
+                max_hops: ``int``: Stop after this many connectors
+            Returns:
+                List of connector dicts from the given port to the end point. A connector of an object
+                that was not loaded has title None.
+            Raise:
+                KeyError: Port is unknown.
+        """
+        con = self.connector(obj_id, title)
+        if con is None:
+            raise KeyError("Unknown port '{}' of object {}".format(title, obj_id))
+        path = [con]
+        seen = {con['id']}
+        while len(path) < max_hops and con['cable'] is not None:
+            peer_id = con['cable']
+            if api is not None and peer_id in self.peer_objects and self.peer_objects[peer_id] is not None:
+                self.load(api, [self.peer_objects[peer_id]])
+            peer = self.connectors[peer_id]
+            if peer_id in seen:
+                break
+            path.append(peer)
+            seen.add(peer_id)
+            if peer['sibling'] is None or peer['sibling'] in seen:
+                break
+            con = self.connectors[peer['sibling']]
+            path.append(con)
+            seen.add(con['id'])
+        return path
+
+    def missing_objects(self):
+        """Object IDs reached by cables whose connectors are not loaded, to be passed to ``load()``"""
+        return list({o for o in self.peer_objects.values() if o is not None})
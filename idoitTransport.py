@@ -0,0 +1,287 @@
+"""Transports used by IdoitAPI to send JSON-RPC requests - over HTTP or from a recording
+
+A transport implements ``Transport``: ``post(url, body, headers, verify)`` sends the serialized JSON-RPC
+request ``body`` (``bytes``) and returns a response object with ``status_code``, ``headers``, ``content``,
+``json()`` and ``raise_for_status()`` - like a ``requests.Response``.
+
+- ``RequestsTransport``: default, a ``requests.Session`` with keep-alive connections
+- ``Urllib3Transport``: less overhead per call, directly on urllib3 connection pools
+- ``RecordingTransport`` / ``ReplayTransport``: record a session to a file and replay it without server
+"""
+import abc
+import json
+import logging
+import threading
+from collections import deque
+
+# requests, urllib3 and compression modules are imported on first use to keep ``import idoit`` fast
+
+
+class Transport(abc.ABC):
+    """Interface of the transports, subclass it and implement ``post`` to add another one"""
+
+    @abc.abstractmethod
+    def post(self, url, body, headers, verify):
+        """Send a HTTP POST request
+
+            Args:
+                url: ``str``: URL of the JSON-RPC endpoint
+                body: ``bytes``: Serialized (and maybe compressed) JSON-RPC request
+                headers: ``dict``: HTTP headers
+                verify: ``bool``: Verify the SSL certificate
+            Returns:
+                Response object like a ``requests.Response``
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release connections and files"""
+        pass
+
+
+class RequestsTransport(Transport):
+    """Default transport, sends the requests with a ``requests.Session`` which keeps connections open.
+    requests is imported and the session created with the first request.
+
+    Args:
+        pool_maxsize: ``int``: Connections kept open per host, should be at least ``batch_max_workers``
+    """
+
+    def __init__(self, pool_maxsize=10):
+        self.pool_maxsize = pool_maxsize
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """``requests.Session`` of this transport"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def post(self, url, body, headers, verify):
+        return self.session.post(url, data=body, headers=headers, verify=verify)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+
+class Urllib3Response():
+    """Response of ``Urllib3Transport``, behaves like a ``requests.Response``"""
+
+    def __init__(self, status_code, content, headers, url):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.url = url
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 600:
+            import requests
+            raise requests.HTTPError("{} Error for url: {}".format(self.status_code, self.url), response=self)
+
+
+class Urllib3Transport(Transport):
+    """Transport directly on urllib3 connection pools - less CPU time per call than ``RequestsTransport``.
+
+    Compressed responses are decoded by urllib3. Requests are not retried and redirects are not followed.
+    Connection and protocol errors of urllib3 are raised as ``requests.ConnectionError`` like with
+    ``RequestsTransport``.
+
+    Example:
+        ``api = IdoitAPI(**settings, transport=Urllib3Transport())``
+
+    Args:
+        pool_maxsize: ``int``: Connections kept open per host, should be at least ``batch_max_workers``
+    """
+
+    def __init__(self, pool_maxsize=10):
+        import urllib3
+        self._urllib3 = urllib3
+        self.pool_maxsize = pool_maxsize
+        self._lock = threading.Lock()
+        self._pools = {}                # verify => PoolManager
+
+    def _pool(self, verify):
+        pool = self._pools.get(verify)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(verify)
+                if pool is None:
+                    cert_reqs = 'CERT_REQUIRED' if verify else 'CERT_NONE'
+                    pool = self._pools[verify] = self._urllib3.PoolManager(maxsize=self.pool_maxsize,
+                                                                           cert_reqs=cert_reqs)
+        return pool
+
+    def post(self, url, body, headers, verify):
+        try:
+            r = self._pool(verify).urlopen('POST', url, body=body, headers=headers, retries=False)
+        except self._urllib3.exceptions.HTTPError as e:
+            import requests
+            raise requests.ConnectionError(e) from e
+        return Urllib3Response(r.status, r.data, r.headers, url)
+
+    def close(self):
+        with self._lock:
+            for pool in self._pools.values():
+                pool.clear()
+            self._pools = {}
+
+
+def request_key(body):
+    """Key to match a recorded request - method and params without apikey, JSON-RPC IDs are ignored
+
+        Args:
+            body: ``bytes / dict / list``: JSON-RPC request or batch request
+        Returns:
+            ``str``
+    """
+    data = json.loads(body) if isinstance(body, (bytes, str)) else body
+
+    def strip(d):
+        params = {k: v for k, v in (d.get('params') or {}).items() if k != 'apikey'}
+        return [d.get('method'), params]
+
+    if isinstance(data, list):
+        return json.dumps([strip(d) for d in data], sort_keys=True)
+    return json.dumps(strip(data), sort_keys=True)
+
+
+def decode_body(body, headers):
+    """Decoded JSON of a request body, decompressed if it has a Content-Encoding header"""
+    encoding = (headers or {}).get('Content-Encoding')
+    if encoding == 'gzip':
+        import gzip
+        body = gzip.decompress(body)
+    elif encoding == 'deflate':
+        import zlib
+        body = zlib.decompress(body)
+    return json.loads(body)
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        import gzip
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class RecordingTransport(Transport):
+    """Send requests with another transport and append every request/response pair to a file.
+
+    The file has one JSON object per line with keys 'key' (see ``request_key()``), 'status' and 'response'.
+    Batch responses are stored in the order of the requests, without JSON-RPC IDs. Headers and apikey are
+    not recorded. Files ending with '.gz' are compressed.
+
+    Example:
+        ``api = IdoitAPI(**settings, transport=RecordingTransport('sync.jsonl.gz'))``
+
+    Args:
+        path: ``str``: File to append to
+        transport: Transport to send the requests with, default ``RequestsTransport``
+    """
+
+    def __init__(self, path, transport=None):
+        self.path = path
+        self.transport = transport or RequestsTransport()
+        self._lock = threading.Lock()
+        self._file = _open(path, 'a')
+
+    def post(self, url, body, headers, verify):
+        response = self.transport.post(url, body, headers, verify)
+        request = decode_body(body, headers)
+        res = response.json() if response.status_code == 200 else None
+        if isinstance(request, list) and isinstance(res, list):
+            by_id = {r.get('id'): r for r in res}
+            res = [by_id.get(r.get('id')) for r in request]
+        line = json.dumps({'key': request_key(request), 'status': response.status_code, 'response': res})
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+        return response
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        self.transport.close()
+
+
+class ReplayResponse():
+    """Response of ``ReplayTransport``, behaves like a ``requests.Response``"""
+
+    def __init__(self, status_code, body, url=None):
+        self.status_code = status_code
+        self._body = body
+        self.url = url
+        self.content = json.dumps(body).encode('utf-8') if body is not None else b''
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 600:
+            import requests
+            raise requests.HTTPError("{} Error (replayed) for url: {}".format(self.status_code, self.url), response=self)
+
+
+class ReplayTransport(Transport):
+    """Answer requests from a file written by ``RecordingTransport`` - no server needed.
+
+    Requests are matched by method and params (see ``request_key()``). Identical requests get the
+    recorded responses in recorded order, when they are used up the last one is repeated.
+    JSON-RPC IDs of the responses are set to the IDs of the current request.
+
+    Example:
+        ``api = IdoitAPI(**settings, transport=ReplayTransport('sync.jsonl.gz'))``
+
+    Args:
+        path: ``str``: File written by ``RecordingTransport``
+
+    Raise:
+        LookupError: Raised by post() when a request was not recorded.
+    """
+
+    def __init__(self, path):
+        self.log = logging.getLogger(__name__)
+        self.path = path
+        self._lock = threading.Lock()
+        self._responses = {}            # key => deque of (status, response)
+        with _open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    self._responses.setdefault(rec['key'], deque()).append((rec['status'], rec['response']))
+
+    def post(self, url, body, headers, verify):
+        request = decode_body(body, headers)
+        key = request_key(request)
+        with self._lock:
+            recorded = self._responses.get(key)
+            if not recorded:
+                raise LookupError("No recorded response for request: {}".format(key[:200]))
+            status, res = recorded.popleft() if len(recorded) > 1 else recorded[0]
+
+        # deep copy, callers change responses (send_rpc_d pops 'id')
+        res = json.loads(json.dumps(res))
+        if isinstance(request, list) and isinstance(res, list):
+            for req, r in zip(request, res):
+                if r is not None:
+                    r['id'] = req.get('id')
+            res = [r for r in res if r is not None]
+        elif isinstance(res, dict) and 'id' in res:
+            res['id'] = request.get('id')
+        return ReplayResponse(status, res, url)
+
+    def close(self):
+        pass